@@ -1,4 +1,20 @@
 from .agent import AIAgent
-from .module import Module
-from .commander import Commander
-from .modules import all_modules
\ No newline at end of file
+from .module import Module, LazyModule, discover_modules
+
+# Commander and ChatClient pull in openai, they are imported on first access
+_LAZY_ATTRIBUTES = {
+    "ChatClient": (".llm", "ChatClient"),
+    "Commander": (".commander", "Commander"),
+    "all_modules": (".modules", "all_modules"),
+}
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        import importlib
+        module_name, attribute = _LAZY_ATTRIBUTES[name]
+        value = getattr(importlib.import_module(module_name, __name__), attribute)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+__all__ = ["AIAgent", "Module", "LazyModule", "discover_modules", "ChatClient", "Commander", "all_modules"]
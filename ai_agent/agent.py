@@ -1,5 +1,6 @@
 from typing import List, Dict
-from .module import Module
+from .module import Module, LazyModule, ENTRY_POINT_GROUP, discover_modules
+from .instrumentation import get_instrumentation
 
 class AIAgent:
     def __init__(self):
@@ -8,11 +9,24 @@ class AIAgent:
     def add_module(self, module):
         self.modules[module.name] = module
 
+    def add_lazy_module(self, name, target, functions=None):
+        self.add_module(LazyModule(name, target, functions))
+
+    def load_plugins(self, group=ENTRY_POINT_GROUP):
+        # Modules installed by other packages, already registered names are kept
+        for module in discover_modules(group):
+            self.modules.setdefault(module.name, module)
+
     def list_modules(self):
         return list(self.modules.keys())
 
     def execute_module(self, module_name, function_name, *args):
         if module_name in self.modules:
-            return self.modules[module_name].execute(function_name, *args)
+            module = self.modules[module_name]
+            # A cold call includes importing a lazily loaded module
+            with get_instrumentation().timer("module", f"{module_name}.{function_name}", cold=not module.loaded) as event:
+                result = module.execute(function_name, *args)
+                event["result_size"] = len(result) if isinstance(result, (str, bytes)) else len(str(result))
+            return result
         else:
             raise ValueError(f"Module '{module_name}' not found")
\ No newline at end of file
@@ -0,0 +1,66 @@
+import asyncio
+import json
+from fnmatch import fnmatch
+
+class InteractiveApproval:
+    async def _ask(self, question: str) -> bool:
+        # Keep the event loop free for other goals while waiting on the user
+        answer = await asyncio.to_thread(input, question)
+        return answer.lower() == 'yes'
+
+    async def approve_step(self, module_name: str, function_name: str, args: list) -> bool:
+        return await self._ask(f"Do you want to execute: {module_name}.{function_name}{tuple(args)}? (yes/no): ")
+
+    async def approve_modification(self, modification: str) -> bool:
+        return await self._ask("Do you want to apply this modification? (yes/no): ")
+
+    async def continue_after_error(self, error_message: str) -> bool:
+        return await self._ask("Do you want to continue execution? (yes/no): ")
+
+    async def approve_plan_reuse(self, goal: str, similarity: float, plan: str) -> bool:
+        print(f"\nA plan achieved a similar goal ({similarity:.0%} similar): {goal}")
+        print(plan)
+        return await self._ask("Do you want to reuse this plan? (yes/no): ")
+
+class PolicyApproval:
+    def __init__(self, allow: list = None, deny: list = None, apply_modifications: bool = True,
+                 continue_on_error: bool = True, reuse_plans: bool = True):
+        self.allow = list(allow) if allow is not None else ["*"]
+        self.deny = list(deny or [])
+        self.apply_modifications = apply_modifications
+        self.continue_on_error = continue_on_error
+        self.reuse_plans = reuse_plans
+
+    @classmethod
+    def from_dict(cls, policy: dict) -> "PolicyApproval":
+        return cls(
+            allow=policy.get("allow"),
+            deny=policy.get("deny"),
+            apply_modifications=policy.get("apply_modifications", True),
+            continue_on_error=policy.get("continue_on_error", True),
+            reuse_plans=policy.get("reuse_plans", True)
+        )
+
+    @classmethod
+    def from_file(cls, path: str) -> "PolicyApproval":
+        with open(path, 'r') as file:
+            return cls.from_dict(json.load(file))
+
+    def is_allowed(self, module_name: str, function_name: str) -> bool:
+        # Rules are module.function patterns, deny rules win over allow rules
+        name = f"{module_name}.{function_name}"
+        if any(fnmatch(name, pattern) for pattern in self.deny):
+            return False
+        return any(fnmatch(name, pattern) for pattern in self.allow)
+
+    async def approve_step(self, module_name: str, function_name: str, args: list) -> bool:
+        return self.is_allowed(module_name, function_name)
+
+    async def approve_modification(self, modification: str) -> bool:
+        return self.apply_modifications
+
+    async def continue_after_error(self, error_message: str) -> bool:
+        return self.continue_on_error
+
+    async def approve_plan_reuse(self, goal: str, similarity: float, plan: str) -> bool:
+        return self.reuse_plans
@@ -0,0 +1,134 @@
+import argparse
+import contextlib
+import json
+import os
+import re
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+def load_goals(path: str) -> list:
+    goals = []
+    with open(path, 'r') as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if isinstance(record, str):
+                record = {"goal": record}
+            record.setdefault("id", f"goal-{len(goals) + 1:04d}")
+            goals.append(record)
+    return goals
+
+def build_agent():
+    from .agent import AIAgent
+    from .modules import all_modules, google_search_module
+
+    agent = AIAgent()
+    for module in all_modules + [google_search_module]:
+        agent.add_module(module)
+    return agent
+
+def run_goal(record: dict, policy: dict, workspace_root: str, max_iterations: int) -> dict:
+    from .approval import PolicyApproval
+    from .commander import Commander
+
+    goal_id = re.sub(r'[^\w.-]', '_', str(record["id"]))
+    workspace_dir = os.path.join(workspace_root, goal_id)
+    log_dir = os.path.join(workspace_root, "logs")
+    os.makedirs(workspace_dir, exist_ok=True)
+    os.makedirs(log_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    # The Commander narrates every step, keep it out of the runner's output
+    with open(os.path.join(log_dir, f"{goal_id}.log"), 'w') as log, contextlib.redirect_stdout(log):
+        try:
+            checkpoint_path = os.path.join(workspace_dir, "checkpoint.jsonl")
+            commander = Commander(
+                build_agent(),
+                approval=PolicyApproval.from_dict(policy),
+                workspace_dir=workspace_dir,
+                max_iterations=max_iterations,
+                checkpoint_path=checkpoint_path
+            )
+            # Rerunning a batch picks up interrupted goals where they stopped
+            if os.path.exists(checkpoint_path):
+                result = commander.resume()
+            else:
+                result = commander.process_goal(record["goal"])
+            status = "achieved" if result == "Goal achieved successfully." else "not_achieved"
+        except Exception as e:
+            result = f"Error running goal: {str(e)}"
+            status = "error"
+
+    return {
+        "id": record["id"],
+        "goal": record["goal"],
+        "status": status,
+        "result": result,
+        "latency": time.perf_counter() - start,
+        "workspace": workspace_dir
+    }
+
+def summarize(results: list, elapsed: float) -> dict:
+    latencies = sorted(result["latency"] for result in results)
+    return {
+        "goals": len(results),
+        "achieved": sum(1 for result in results if result["status"] == "achieved"),
+        "errors": sum(1 for result in results if result["status"] == "error"),
+        "elapsed": elapsed,
+        "goals_per_minute": len(results) / elapsed * 60 if elapsed else 0.0,
+        "latency_mean": statistics.mean(latencies) if latencies else 0.0,
+        "latency_p50": latencies[len(latencies) // 2] if latencies else 0.0,
+        "latency_p95": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] if latencies else 0.0
+    }
+
+def init_worker(workers: int):
+    # Every worker has its own request scheduler, the API key's rate limits are split between them
+    os.environ.setdefault("AGENT_LLM_RATE_SHARES", str(workers))
+
+def run_batch(goals: list, policy: dict, workers: int, workspace_root: str, max_iterations: int,
+              output_path: str = None):
+    results = []
+    start = time.perf_counter()
+    output = open(output_path, 'w') if output_path else None
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(workers,)) as pool:
+            futures = [pool.submit(run_goal, record, policy, workspace_root, max_iterations) for record in goals]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                print(f"[{len(results)}/{len(goals)}] {result['id']}: {result['status']} in {result['latency']:.1f}s")
+                if output:
+                    output.write(json.dumps(result) + "\n")
+                    output.flush()
+    finally:
+        if output:
+            output.close()
+    return results, summarize(results, time.perf_counter() - start)
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(description="Run goals from a JSONL file without interactive prompts")
+    parser.add_argument("goals", help="JSONL file with one goal per line, either a string or {\"id\": ..., \"goal\": ...}")
+    parser.add_argument("--policy", help="JSON approval policy with allow/deny module.function patterns")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--workspace-root", default="runs")
+    parser.add_argument("--max-iterations", type=int, default=5)
+    parser.add_argument("--output", help="JSONL file receiving one result per goal")
+    options = parser.parse_args(argv)
+
+    policy = {}
+    if options.policy:
+        with open(options.policy, 'r') as file:
+            policy = json.load(file)
+
+    goals = load_goals(options.goals)
+    _, summary = run_batch(goals, policy, options.workers, options.workspace_root, options.max_iterations, options.output)
+
+    print(f"\nGoals: {summary['goals']} (achieved: {summary['achieved']}, errors: {summary['errors']})")
+    print(f"Throughput: {summary['goals_per_minute']:.2f} goals/minute over {summary['elapsed']:.1f}s")
+    print(f"Latency per goal: mean {summary['latency_mean']:.1f}s, p50 {summary['latency_p50']:.1f}s, p95 {summary['latency_p95']:.1f}s")
+
+if __name__ == "__main__":
+    main()
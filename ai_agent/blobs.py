@@ -0,0 +1,86 @@
+import hashlib
+import json
+import os
+import tempfile
+from .results import Blob, StepResult
+from .workspace import get_workspace_dir
+
+BLOB_DIR = ".blobs"
+PREVIEW_CHARS = int(os.getenv("AGENT_BLOB_PREVIEW_CHARS", "600"))
+SCHEMA_KEYS = 20
+
+class BlobStore:
+    # Content-addressed, the same result stored twice takes one file
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def put(self, data: bytes) -> str:
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Written under a temporary name so a reader never sees a partial blob
+            fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, "wb") as file:
+                file.write(data)
+            os.replace(temp_path, path)
+        return path
+
+def blob_store() -> BlobStore:
+    return BlobStore(os.path.join(get_workspace_dir(), BLOB_DIR))
+
+def describe_json(value, depth: int = 3) -> str:
+    if isinstance(value, dict):
+        if depth == 0:
+            return f"object of {len(value)} keys"
+        fields = [f"{key}: {describe_json(item, depth - 1)}" for key, item in list(value.items())[:SCHEMA_KEYS]]
+        more = f", ... {len(value) - SCHEMA_KEYS} more" if len(value) > SCHEMA_KEYS else ""
+        return "{" + ", ".join(fields) + more + "}"
+    if isinstance(value, list):
+        if not value:
+            return "list[0]"
+        return f"list[{len(value)}] of {describe_json(value[0], depth - 1) if depth else type(value[0]).__name__}"
+    return "null" if value is None else type(value).__name__
+
+def head_and_tail(text: str, chars: int) -> str:
+    if len(text) <= chars:
+        return text
+    head = chars * 2 // 3
+    tail = chars - head
+    return f"{text[:head]}\n... [{len(text) - chars:,} characters omitted] ...\n{text[-tail:]}"
+
+def spill(result: StepResult, threshold: int, store: BlobStore = None, preview_chars: int = None) -> StepResult:
+    # Results larger than `threshold` characters move to the blob store, the step keeps a preview
+    if result.blob is not None or result.kind not in ("text", "json", "bytes"):
+        return result
+    value = result.value
+    if result.kind == "json":
+        rendered = json.dumps(value, default=str)
+        data = rendered.encode("utf-8")
+    elif result.kind == "bytes":
+        rendered = value.decode("utf-8", errors="replace")
+        data = value
+    else:
+        rendered = value
+        data = None
+    if len(rendered) <= threshold:
+        return result
+    data = data if data is not None else rendered.encode("utf-8")
+
+    path = (store or blob_store()).put(data)
+    digest = os.path.basename(path)[:12]
+    preview_chars = preview_chars or PREVIEW_CHARS
+    if result.kind == "json":
+        summary = f"JSON {type(value).__name__}, {len(rendered):,} characters"
+        body = f"Schema: {describe_json(value)}\n{head_and_tail(rendered, preview_chars)}"
+    elif result.kind == "bytes":
+        summary = f"bytes, {len(data):,} bytes"
+        body = head_and_tail(rendered, preview_chars)
+    else:
+        summary = f"text, {len(rendered):,} characters, {rendered.count(chr(10)) + 1:,} lines"
+        body = head_and_tail(rendered, preview_chars)
+    preview = f"[Stored as blob {digest} ({summary}); steps that reference this result receive all of it]\n{body}"
+    return StepResult(None, result.source, result.original_type, blob=Blob(path, result.kind, len(data), preview))
@@ -0,0 +1,88 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+class DiskCache:
+    def __init__(self, path: str, max_bytes: int = None, ttl: float = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "key TEXT PRIMARY KEY, value BLOB, meta TEXT, size INTEGER, created REAL, accessed REAL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+
+    def get(self, key: str, allow_expired: bool = False):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT value, meta, created FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, meta, created = row
+            if self.ttl and not allow_expired and time.time() - created > self.ttl:
+                self._connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            self._connection.execute("UPDATE entries SET accessed = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+            return value, json.loads(meta)
+
+    def put(self, key: str, value: bytes, meta: dict = None):
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO entries (key, value, meta, size, created, accessed) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, value, json.dumps(meta or {}), len(value), now, now)
+            )
+            self._evict()
+
+    def touch(self, key: str, meta: dict = None):
+        # Mark an entry as fresh again without rewriting its value
+        now = time.time()
+        with self._lock:
+            if meta is None:
+                self._connection.execute("UPDATE entries SET created = ?, accessed = ? WHERE key = ?", (now, now, key))
+            else:
+                self._connection.execute(
+                    "UPDATE entries SET meta = ?, created = ?, accessed = ? WHERE key = ?",
+                    (json.dumps(meta), now, now, key)
+                )
+
+    def delete(self, key: str):
+        with self._lock:
+            self._connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+
+    def _evict(self):
+        if not self.max_bytes:
+            return
+        total = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop least recently used entries until the store fits again
+        for key, size in self._connection.execute("SELECT key, size FROM entries ORDER BY accessed").fetchall():
+            self._connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return {"entries": entries, "bytes": size, "hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
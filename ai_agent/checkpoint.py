@@ -0,0 +1,73 @@
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+
+@dataclass
+class GoalState:
+    goal: str
+    iteration: int = 1
+    memory: dict = None
+    # Plan of the interrupted iteration and what already happened to it
+    plan: str = None
+    modifications: list = field(default_factory=list)
+    steps: dict = field(default_factory=dict)
+    result: str = None
+
+class CheckpointJournal:
+    # One JSON record per line, only ever appended to, so a crash loses at most the line being written
+    def __init__(self, path: str, resume: bool = False, fsync: bool = None):
+        self.path = path
+        self.fsync = fsync if fsync is not None else os.getenv("AGENT_CHECKPOINT_FSYNC", "0") == "1"
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = open(path, "a" if resume else "w", encoding="utf-8")
+
+    def write(self, kind: str, **fields):
+        line = json.dumps({"type": kind, "time": time.time(), **fields}, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+    @staticmethod
+    def load(path: str) -> GoalState:
+        state = None
+        with open(path, "r", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # A record cut short by the crash
+                kind = record["type"]
+                if kind == "goal":
+                    state = GoalState(goal=record["goal"])
+                elif state is None:
+                    raise ValueError(f"Checkpoint {path} does not start with a goal record")
+                elif kind == "iteration":
+                    state.iteration = record["iteration"]
+                    state.memory = record["memory"]
+                    state.plan = None
+                    state.modifications = []
+                    state.steps = {}
+                elif kind == "plan":
+                    state.plan = record["plan"]
+                elif kind == "step":
+                    state.steps[record["index"]] = record
+                elif kind == "modification":
+                    # Results of the steps the modification replaced are no longer part of the plan
+                    state.modifications.append((record["index"], record["modification"]))
+                    state.steps = {index: step for index, step in state.steps.items() if index <= record["index"]}
+                elif kind == "done":
+                    state.result = record["result"]
+        if state is None:
+            raise ValueError(f"Checkpoint {path} is empty")
+        return state
@@ -1,145 +1,512 @@
 import os
+import asyncio
+import time
 import openai
-import json
 from dotenv import load_dotenv
 from .agent import AIAgent
+from .llm import ChatClient
+from .memory import ConversationMemory, Tokenizer
+from .instrumentation import get_instrumentation
+from .approval import InteractiveApproval
+from .workspace import get_workspace_dir, set_workspace_dir
+from .results import StepResult
+from .blobs import spill
+from .plan_cache import PlanCache, PlanMatch, plan_cache_from_env
+from .checkpoint import CheckpointJournal, GoalState
+from .memo import StepMemo
+from .scheduler import is_retryable
+from .plan import (
+    STEP_FORMAT, STEP_FORMAT_RULES, PlanError, PlanStream, Step, StepRef, compile_plan, compile_steps, section_lines,
+    coerce_args, format_module_signatures
+)
 import re
-from .modules.json_operations import json_operations_module
+from typing import get_type_hints
+from .modules import json_operations_module
 
-WORKSPACE_DIR = "workspace"
+STEP_EVALUATION_POLICIES = ("every", "batch", "anomaly")
+PLAN_SYSTEM_PROMPT = "You are an AI assistant that creates detailed, step-by-step plans to achieve goals using available modules and functions. Analyze the modules and their functions carefully to determine the best approach. Learn from previous interactions and errors to improve your plans. Prefer working with JSON data whenever possible."
 
 class Commander:
-    def __init__(self, agent: AIAgent):
+    def __init__(self, agent: AIAgent, max_workers: int = None, llm: ChatClient = None,
+                 step_evaluation: str = None, evaluation_batch_size: int = None,
+                 memory: ConversationMemory = None, approval=None, workspace_dir: str = None,
+                 max_iterations: int = None, plan_cache: PlanCache = None, checkpoint_path: str = None,
+                 step_memo: StepMemo = None, stream_plan: bool = None, blob_threshold: int = None):
         self.agent = agent
         load_dotenv()
         openai.api_key = os.getenv("OPENAI_API_KEY")
         self.model = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
-        if not openai.api_key:
+        self.max_workers = max_workers or int(os.getenv("AGENT_MAX_WORKERS", "4"))
+        self.step_evaluation = step_evaluation or os.getenv("AGENT_STEP_EVALUATION", "every")
+        self.evaluation_batch_size = evaluation_batch_size or int(os.getenv("AGENT_STEP_EVALUATION_BATCH", "3"))
+        if self.step_evaluation not in STEP_EVALUATION_POLICIES:
+            raise ValueError(f"Unknown step evaluation policy '{self.step_evaluation}', expected one of {', '.join(STEP_EVALUATION_POLICIES)}")
+        self.llm = llm or ChatClient(model=self.model)
+        # Replayed sessions are served entirely from the completion cache
+        if not openai.api_key and self.llm.cache_mode != "replay":
             raise ValueError("OPENAI_API_KEY not found in environment variables")
-        self.conversation_history = []
+        self.conversation_history = memory or ConversationMemory(tokenizer=Tokenizer(self.model))
+        self.approval = approval or InteractiveApproval()
+        self.workspace_dir = workspace_dir
+        self.max_iterations = max_iterations or int(os.getenv("AGENT_MAX_ITERATIONS", "0"))
+        self.plan_cache = plan_cache if plan_cache is not None else plan_cache_from_env()
+        self.checkpoint_path = checkpoint_path or os.getenv("AGENT_CHECKPOINT")
+        self._journal = None
+        self._first_step_at = None
+        # Results of idempotent steps are reused across iterations and plan modifications
+        if step_memo is None and os.getenv("AGENT_STEP_MEMO", "1") != "0":
+            step_memo = StepMemo()
+        self.step_memo = step_memo
+        # Steps start while the rest of the plan is still being generated
+        self.stream_plan = stream_plan if stream_plan is not None else os.getenv("AGENT_STREAM_PLAN", "0") == "1"
+        # Larger results are kept in the workspace's blob store, prompts only see a preview (0 keeps everything in memory)
+        self.blob_threshold = blob_threshold if blob_threshold is not None else int(os.getenv("AGENT_BLOB_THRESHOLD", "4000"))
         self.agent.add_module(json_operations_module)
 
     def process_goal(self, goal: str) -> str:
-        self.goal = goal
-        self.conversation_history.append(("user", goal))
-        iteration = 1
+        return asyncio.run(self.aprocess_goal(goal))
+
+    async def aprocess_goal(self, goal: str) -> str:
+        return await self._process(GoalState(goal=goal))
+
+    def resume(self, checkpoint_path: str = None) -> str:
+        return asyncio.run(self.aresume(checkpoint_path))
+
+    async def aresume(self, checkpoint_path: str = None) -> str:
+        # Continues the goal recorded in the checkpoint after its last completed step
+        self.checkpoint_path = checkpoint_path or self.checkpoint_path
+        if not self.checkpoint_path:
+            raise ValueError("No checkpoint to resume from (pass a path or set AGENT_CHECKPOINT)")
+        state = await asyncio.to_thread(CheckpointJournal.load, self.checkpoint_path)
+        if state.result is not None:
+            return state.result
+        return await self._process(state, resumed=True)
+
+    async def _process(self, state: GoalState, resumed: bool = False) -> str:
+        self.goal = goal = state.goal
+        fresh_start = state.iteration == 1 and state.plan is None
+        self._plan_match = None
+        if self.plan_cache is not None and fresh_start:
+            self._plan_match = await asyncio.to_thread(self.plan_cache.lookup, goal)
+        if self.workspace_dir:
+            set_workspace_dir(self.workspace_dir)
+        if self.checkpoint_path:
+            self._journal = CheckpointJournal(self.checkpoint_path, resume=resumed)
+            if not resumed:
+                self._checkpoint("goal", goal=goal)
+        try:
+            result = await self._run_iterations(state)
+            self._checkpoint("done", result=result)
+            return result
+        finally:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+
+    def _checkpoint(self, kind: str, **fields):
+        if self._journal is not None:
+            self._journal.write(kind, **fields)
+
+    async def _run_iterations(self, state: GoalState) -> str:
+        goal = state.goal
+        if state.memory is not None:
+            self.conversation_history.restore(state.memory)
+        else:
+            self.conversation_history.add("user", goal)
+        iteration = state.iteration
+        # The interrupted iteration carries on with its plan and completed steps
+        resume = state if state.plan is not None else None
         while True:
+            if self.max_iterations and iteration > self.max_iterations:
+                return f"Goal not achieved after {self.max_iterations} iterations."
             try:
                 print(f"\n--- Iteration {iteration} ---")
-                plan = self._create_plan()
-                print("Plan:")
-                print(plan)
-                self.conversation_history.append(("assistant", plan))
-                result = self._execute_plan(plan)
-                print("\nExecution Result:")
-                print(result)
-                evaluation = self._evaluate_result(result)
-                print("\nEvaluation:")
-                print(evaluation)
-                if self._is_goal_achieved(evaluation):
+                with get_instrumentation().timer("iteration", "iteration", iteration=iteration) as event:
+                    self._iteration_started = time.perf_counter()
+                    self._first_step_at = None
+                    if resume is not None:
+                        plan = resume.plan
+                    else:
+                        self._checkpoint("iteration", iteration=iteration, memory=self.conversation_history.snapshot())
+                        await self.conversation_history.fold(self._summarize_history)
+                    if resume is None and self.stream_plan:
+                        print("Plan:")
+                        plan, result = await self._stream_and_execute_plan()
+                    else:
+                        if resume is None:
+                            plan = await self._create_plan()
+                            self._checkpoint("plan", plan=plan)
+                        print("Plan:")
+                        print(plan)
+                        self.conversation_history.add("assistant", plan)
+                        result = await self._execute_plan(plan, resume)
+                    resume = None
+                    if self._first_step_at is not None:
+                        event["first_step"] = self._first_step_at - self._iteration_started
+                    print("\nExecution Result:")
+                    print(result)
+                    evaluation = await self._evaluate_result(result)
+                    print("\nEvaluation:")
+                    print(evaluation)
+                    event["goal_achieved"] = self._is_goal_achieved(evaluation)
+                if event["goal_achieved"]:
+                    if self.plan_cache is not None:
+                        await asyncio.to_thread(self.plan_cache.add, goal, "\n".join(str(step) for step in self.plan_steps))
                     return "Goal achieved successfully."
                 iteration += 1
             except Exception as e:
+                resume = None
                 error_msg = f"Error in iteration {iteration}: {str(e)}"
                 print(f"\nError occurred: {error_msg}")
-                solution = self._get_error_solution(error_msg, "process_goal", "iteration", [str(iteration)])
-                print("Proposed solution:")
-                print(solution)
-                self.conversation_history.append(("error", error_msg))
-                self.conversation_history.append(("solution", solution))
-                continue_execution = input("Do you want to continue execution? (yes/no): ")
-                if continue_execution.lower() != 'yes':
+                self.conversation_history.add("error", error_msg)
+                # The API stayed overloaded through every retry, asking the model for a fix would only add load
+                if not is_retryable(e):
+                    solution = await self._get_error_solution(error_msg, "process_goal", "iteration", [str(iteration)])
+                    print("Proposed solution:")
+                    print(solution)
+                    self.conversation_history.add("solution", solution)
+                if not await self.approval.continue_after_error(error_msg):
                     return "Execution stopped due to error."
+                iteration += 1
 
-    def _execute_plan(self, plan: str) -> str:
-        lines = plan.strip().split('\n')
-        result = []
-        executing_plan = False
-        step_results = {}
-        plan_steps = []
-
-        for line in lines:
-            if line.lower().startswith("plan:"):
-                executing_plan = True
+    async def _chat(self, system: str, prompt: str, prompt_name: str = None) -> str:
+        return await self.llm.complete([
+            {"role": "system", "content": system},
+            {"role": "user", "content": prompt}
+        ], prompt_name=prompt_name)
+
+    async def _execute_plan(self, plan: str, resume: GoalState = None) -> str:
+        self._start_execution(compile_plan(plan, self.agent.modules))
+        if resume is not None:
+            self._restore_steps(resume)
+        return await self._run_steps()
+
+    async def _stream_and_execute_plan(self) -> tuple:
+        self._start_execution([])
+        parser = PlanStream(self.agent.modules)
+        chunks = self._stream_plan()
+        try:
+            result = await self._run_steps(parser, chunks)
+        finally:
+            await chunks.aclose()
+        print()
+        plan = parser.text
+        # Written after the steps it started, a crash before this point replans the iteration
+        self._checkpoint("plan", plan=plan)
+        self.conversation_history.add("assistant", plan)
+        parser.check()
+        return plan, result
+
+    def _start_execution(self, plan_steps: list):
+        self.plan_steps = plan_steps
+        self.step_results = {}
+        self._step_log = []
+        self._started = set()
+        self._finished = set()
+        self._tasks = {}
+        self._pending_reviews = []
+        self._step_semaphore = asyncio.Semaphore(self.max_workers)
+        self._plan_modified = False
+
+    async def _next_chunk(self, chunks):
+        try:
+            return await chunks.__anext__()
+        except StopAsyncIteration:
+            return None
+
+    async def _run_steps(self, parser: PlanStream = None, chunks=None) -> str:
+        stopped = False
+        reading = None
+        stream_error = None
+        while True:
+            # Launch every step whose referenced results are available
+            while not stopped and stream_error is None:
+                ready = self._ready_steps()
+                if not ready:
+                    break
+                for i in ready:
+                    stopped = await self._start_step(i)
+                    if stopped:
+                        break
+
+            # A stopped or modified plan needs none of the steps still to come
+            if chunks is not None and (stopped or self._plan_modified):
+                if reading is not None:
+                    reading.cancel()
+                    await asyncio.gather(reading, return_exceptions=True)
+                    reading = None
+                chunks = None
+            if chunks is not None and reading is None:
+                reading = asyncio.create_task(self._next_chunk(chunks))
+
+            if stopped:
+                self._cancel_reviews()
+            elif not self._tasks and reading is None and self._pending_reviews:
+                # Evaluate a partial batch once nothing else runs, before the plan is reported or a step
+                # with side effects starts
+                self._flush_reviews()
+
+            if not self._tasks and reading is None:
+                break
+
+            waiting = set(self._tasks) | ({reading} if reading is not None else set())
+            done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+            if reading in done:
+                try:
+                    chunk = reading.result()
+                except Exception as e:
+                    # Steps already running finish before the error reaches the iteration
+                    stream_error, chunk = e, None
+                reading = None
+                if stream_error is not None:
+                    chunks = None
+                elif chunk is None:
+                    chunks = None
+                    self.plan_steps.extend(parser.close())
+                else:
+                    print(chunk, end="", flush=True)
+                    self.plan_steps.extend(parser.feed(chunk))
+            for task in done:
+                # A plan modification may already have collected this task
+                if task in self._tasks:
+                    stopped = await self._finish_task(task, stopped) or stopped
+
+        if stream_error is not None:
+            raise stream_error
+        # Report steps in plan order rather than completion order
+        ordered_logs = sorted(self._step_log, key=lambda entry: entry[0])
+        return "\n".join(line for _, step_log in ordered_logs for line in step_log)
+
+    def _restore_steps(self, state: GoalState):
+        for index, modification in state.modifications:
+            self.plan_steps = self._modify_plan(self.plan_steps, index, modification)
+        for index, record in sorted(state.steps.items()):
+            if index >= len(self.plan_steps):
+                continue
+            self.step_results[f"result from step {index + 1}"] = StepResult.from_record(record["result"])
+            self._step_log.append((index, list(record["log"])))
+            self._started.add(index)
+            self._finished.add(index)
+        print(f"Resuming with {len(self._finished)} of {len(self.plan_steps)} steps completed")
+
+    def _reviewing_before(self, index: int) -> bool:
+        # A review of an earlier step may still replace this one
+        return any(entry[0] < index for entry, _ in self._pending_reviews) or any(
+            kind == "review" and entry[0] < index for kind, entry in self._tasks.values())
+
+    def _ready_steps(self) -> list:
+        # Steps with side effects keep their place in the plan: they start once every earlier step has
+        # finished and been reviewed, and later steps wait for them. Other steps only wait for the
+        # results they reference.
+        finished_numbers = {i + 1 for i in self._finished}
+        ready = []
+        for i, step in enumerate(self.plan_steps):
+            ordered = not self.agent.modules[step.module].is_idempotent(step.function)
+            if i not in self._started and step.depends_on <= finished_numbers and (
+                    not ordered or (all(j in self._finished for j in range(i)) and not self._reviewing_before(i))):
+                ready.append(i)
+            if ordered and i not in self._finished:
+                break
+        return ready
+
+    def _resolve_args(self, step: Step) -> list:
+        args = [self._process_arg(arg, self.step_results) for arg in step.args]
+        return coerce_args(self.agent.modules[step.module].get_function(step.function), args)
+
+    async def _start_step(self, index: int) -> bool:
+        step = self.plan_steps[index]
+        step_log = []
+        self._step_log.append((index, step_log))
+        self._started.add(index)
+        if self._first_step_at is None:
+            self._first_step_at = time.perf_counter()
+
+        try:
+            module_name, function_name = step.module, step.function
+            args = self._resolve_args(step)
+
+            # Ask for permission before executing each step
+            if not await self.approval.approve_step(module_name, function_name, args):
+                step_log.append(f"Skipped: {module_name}.{function_name}{tuple(args)}")
+                self._finished.add(index)
+                return False
+
+            if function_name in ('make_get_request', 'get_page_text') and args:
+                url = args[0]
+                if not self._is_valid_url(url):
+                    raise ValueError(f"Invalid URL: {url}")
+        except Exception as e:
+            self._finished.add(index)
+            return await self._handle_step_error(step, e, step_log)
+
+        entry = (index, step, module_name, function_name, args, step_log)
+        task = asyncio.create_task(self._run_step(index, module_name, function_name, args))
+        self._tasks[task] = ("step", entry)
+        return False
+
+    async def _run_step(self, index: int, module_name: str, function_name: str, args: list):
+        queued_at = time.perf_counter()
+        async with self._step_semaphore:
+            queued = time.perf_counter() - queued_at
+            with get_instrumentation().timer("step", f"{module_name}.{function_name}", step=index + 1, queued=queued):
+                return await asyncio.to_thread(self._execute_step, module_name, function_name, args)
+
+    def _execute_step(self, module_name: str, function_name: str, args: list) -> StepResult:
+        memoize = self.step_memo is not None and self.agent.modules[module_name].is_memoizable(function_name)
+        if memoize:
+            key, signature, memoized = self.step_memo.lookup(module_name, function_name, args)
+            if memoized is not None:
+                get_instrumentation().emit("memo", f"{module_name}.{function_name}", 0.0)
+                return memoized
+
+        module_result = self.agent.execute_module(module_name, function_name, *args)
+        source = args[0] if args and isinstance(args[0], str) and args[0].startswith('http') else None
+        result = StepResult.from_value(module_result, source=source)
+        if self.blob_threshold:
+            result = spill(result, self.blob_threshold)
+        if memoize:
+            self.step_memo.store(key, signature, result)
+        return result
+
+    def _queue_review(self, entry: tuple, module_result):
+        _, _, module_name, function_name, _, _ = entry
+        if self.step_evaluation == "anomaly" and not self._is_anomalous(module_name, function_name, module_result):
+            return
+        self._pending_reviews.append((entry, module_result))
+        if self.step_evaluation != "batch" or len(self._pending_reviews) >= self.evaluation_batch_size:
+            self._flush_reviews()
+
+    def _flush_reviews(self):
+        batch = sorted(self._pending_reviews, key=lambda item: item[0][0])
+        self._pending_reviews = []
+        review = asyncio.create_task(self._review_steps(batch))
+        # A batch is reviewed as of its last step, modifications apply after it
+        self._tasks[review] = ("review", batch[-1][0])
+
+    def _is_anomalous(self, module_name: str, function_name: str, module_result: StepResult) -> bool:
+        # Spilled results are large and never empty, only their preview is looked at
+        value = module_result.value if module_result.blob is None else str(module_result)
+        if value is None:
+            return True
+        if isinstance(value, str) and ("Error" in value or not value.strip()):
+            return True
+        if isinstance(value, (dict, list)) and not value:
+            return True
+        expected_type = self._expected_result_type(module_name, function_name)
+        return expected_type is not None and not issubclass(module_result.original_type, expected_type)
+
+    def _expected_result_type(self, module_name: str, function_name: str):
+        function = self.agent.modules[module_name].get_function(function_name)
+        try:
+            expected_type = get_type_hints(function).get("return")
+        except Exception:
+            return None
+        return expected_type if isinstance(expected_type, type) else None
+
+    async def _review_steps(self, batch: list):
+        # Runs alongside the steps launched after these ones finished
+        if len(batch) == 1:
+            entry, module_result = batch[0]
+            plan_modification = await self._evaluate_step_result(module_result, entry[0], self.plan_steps)
+        else:
+            plan_modification = await self._evaluate_step_results(batch, self.plan_steps)
+
+        solutions = []
+        for (_, step, module_name, function_name, _, step_log), module_result in batch:
+            if "Error" in str(module_result):
+                # Arguments as the plan wrote them, a referenced result may be far too large for the prompt
+                solution = await self._get_error_solution(module_result, module_name, function_name, [str(arg) for arg in step.args])
+                solutions.append((step_log, solution))
+        return plan_modification, solutions
+
+    async def _finish_task(self, task, stopped: bool) -> bool:
+        kind, entry = self._tasks.pop(task)
+        index, step, module_name, function_name, args, step_log = entry
+
+        try:
+            if kind == "step":
+                self._finished.add(index)
+                module_result = task.result()
+                step_log.append(f"{module_name}.{function_name} result: {module_result}")
+                self.step_results[f"result from step {index + 1}"] = module_result
+                self._checkpoint("step", index=index, result=module_result.to_record(), log=step_log)
+                if not stopped:
+                    self._queue_review(entry, module_result)
+                return False
+
+            # Evaluate the result and potentially modify the plan
+            plan_modification, solutions = task.result()
+            if plan_modification and not plan_modification.startswith("No modification needed"):
+                print("\nPlan modification suggested:")
+                print(plan_modification)
+                if await self.approval.approve_modification(plan_modification):
+                    await self._apply_plan_modification(index, plan_modification)
+
+            for failed_step_log, solution in solutions:
+                failed_step_log.append(f"Error solution: {solution}")
+        except Exception as e:
+            return await self._handle_step_error(step, e, step_log)
+
+        return False
+
+    def _cancel_reviews(self):
+        self._pending_reviews = []
+        for task, (kind, _) in list(self._tasks.items()):
+            if kind == "review":
+                task.cancel()
+                del self._tasks[task]
+
+    async def _apply_plan_modification(self, index: int, modification: str):
+        # Compile first so an invalid modification leaves the running plan untouched
+        plan_steps = self._modify_plan(self.plan_steps, index, modification)
+        # Later steps that are already running belong to the old plan
+        superseded = {task: self._tasks.pop(task) for task, (_, entry) in list(self._tasks.items()) if entry[0] > index}
+        for task, (kind, _) in superseded.items():
+            if kind == "review":
+                task.cancel()
+        await asyncio.gather(*superseded, return_exceptions=True)
+        for task, (kind, entry) in superseded.items():
+            _, step, module_name, function_name, args, step_log = entry
+            if kind != "step":
                 continue
-            if executing_plan and line.strip():
-                plan_steps.append(line.strip())
-
-        for i, step in enumerate(plan_steps):
             try:
-                # Remove the step number if present
-                step = re.sub(r'^\d+\.\s*', '', step)
-                
-                parts = step.split(',', 1)
-                if len(parts) < 1:
-                    raise ValueError(f"Invalid step format: {step}")
-                
-                module_func = parts[0].strip()
-                args = parts[1].strip() if len(parts) > 1 else ""
-                
-                module_parts = module_func.split('.')
-                if len(module_parts) != 2:
-                    raise ValueError(f"Invalid module.function format: {module_func}")
-                
-                module_name, function_name = module_parts
-                args = [self._process_arg(arg.strip(), step_results) for arg in args.split(',') if arg.strip()]
-
-                # Ask for permission before executing each step
-                permission = input(f"Do you want to execute: {module_name}.{function_name}{tuple(args)}? (yes/no): ")
-                if permission.lower() != 'yes':
-                    result.append(f"Skipped: {module_name}.{function_name}{tuple(args)}")
-                    continue
-
-                if function_name == 'make_get_request' and args:
-                    url = args[0]
-                    if not self._is_valid_url(url):
-                        raise ValueError(f"Invalid URL: {url}")
-
-                module_result = self.agent.execute_module(module_name, function_name, *args)
-                
-                # Try to convert the result to JSON if it's not already
-                if module_name != 'json_operations' and isinstance(module_result, str):
-                    try:
-                        json_result = self.agent.execute_module("json_operations", "to_json", module_result)
-                        if not json_result.startswith("Error"):
-                            module_result = json_result
-                    except:
-                        pass  # If conversion fails, keep the original result
-
-                result.append(f"{module_name}.{function_name} result: {module_result}")
-                step_results[f"result from step {len(result)}"] = module_result
-
-                # Evaluate the result and potentially modify the plan
-                plan_modification = self._evaluate_step_result(module_result, i, plan_steps)
-                if plan_modification and not plan_modification.startswith("No modification needed"):
-                    print("\nPlan modification suggested:")
-                    print(plan_modification)
-                    apply_modification = input("Do you want to apply this modification? (yes/no): ")
-                    if apply_modification.lower() == 'yes':
-                        plan_steps = self._modify_plan(plan_steps, i, plan_modification)
-                        print("\nUpdated plan:")
-                        for j, updated_step in enumerate(plan_steps[i+1:], start=i+1):
-                            print(f"{j}. {updated_step}")
-
-                if "Error" in module_result:
-                    solution = self._get_error_solution(module_result, module_name, function_name, args)
-                    result.append(f"Error solution: {solution}")
+                step_log.append(f"{module_name}.{function_name} result: {task.result()}")
             except Exception as e:
-                error_msg = f"Error executing step: {step}. Error: {str(e)}"
-                result.append(error_msg)
-                print(f"\nError occurred: {error_msg}")
-                solution = self._get_error_solution(error_msg, "unknown", "unknown", [])
-                print("Proposed solution:")
-                print(solution)
-                result.append(f"Error solution: {solution}")
-                continue_execution = input("Do you want to continue execution? (yes/no): ")
-                if continue_execution.lower() != 'yes':
-                    result.append("Execution stopped due to error.")
-                    break
-
-        return "\n".join(result)
-
-    def _evaluate_result(self, result: str) -> str:
+                step_log.append(f"Error executing step: {step}. Error: {str(e)}")
+
+        # Steps of the old plan that already ran stay visible, marked, under the step that changed the plan
+        modified_log = next(step_log for i, step_log in self._step_log if i == index)
+        for i, step_log in sorted((entry for entry in self._step_log if entry[0] > index), key=lambda entry: entry[0]):
+            modified_log.extend(f"Superseded step {i + 1} of the previous plan: {line}" for line in step_log)
+        self._step_log = [entry for entry in self._step_log if entry[0] <= index]
+
+        self._pending_reviews = [item for item in self._pending_reviews if item[0][0] <= index]
+        self.plan_steps = plan_steps
+        self._plan_modified = True
+        self._checkpoint("modification", index=index, modification=modification)
+        self._started = {i for i in self._started if i <= index}
+        self._finished = {i for i in self._finished if i <= index}
+        for key in [key for key in self.step_results if int(key.split()[-1]) > index + 1]:
+            del self.step_results[key]
+
+        print("\nUpdated plan:")
+        for updated_step in self.plan_steps[index+1:]:
+            print(f"{updated_step.number}. {updated_step}")
+
+    async def _handle_step_error(self, step: str, error: Exception, step_log: list) -> bool:
+        error_msg = f"Error executing step: {step}. Error: {str(error)}"
+        step_log.append(error_msg)
+        print(f"\nError occurred: {error_msg}")
+        solution = await self._get_error_solution(error_msg, "unknown", "unknown", [])
+        print("Proposed solution:")
+        print(solution)
+        step_log.append(f"Error solution: {solution}")
+        if not await self.approval.continue_after_error(error_msg):
+            step_log.append("Execution stopped due to error.")
+            return True
+        return False
+
+    async def _evaluate_result(self, result: str) -> str:
         prompt = f"""
         Goal: {self.goal}
         Execution result:
@@ -168,16 +535,12 @@ class Commander:
         Response:
         """
 
-        response = openai.ChatCompletion.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": "You are an AI assistant that evaluates the results of executed plans and determines if the goal has been achieved. If not, you provide guidance on what steps to take next. Prefer working with JSON data whenever possible."},
-                {"role": "user", "content": prompt}
-            ]
+        evaluation = await self._chat(
+            "You are an AI assistant that evaluates the results of executed plans and determines if the goal has been achieved. If not, you provide guidance on what steps to take next. Prefer working with JSON data whenever possible.",
+            prompt,
+            prompt_name="evaluate_result"
         )
-
-        evaluation = response.choices[0].message.content
-        self.conversation_history.append(("assistant", evaluation))
+        self.conversation_history.add("assistant", evaluation)
         return evaluation
 
     def _is_goal_achieved(self, evaluation: str) -> bool:
@@ -186,40 +549,46 @@ class Commander:
     def _format_available_modules(self):
         formatted_modules = []
         for module_name, module in self.agent.modules.items():
-            functions = module.list_functions()
-            formatted_modules.append(f"{module_name}: {', '.join(functions)}")
+            formatted_modules.append(f"{module_name}: {format_module_signatures(module)}")
         return "\n".join(formatted_modules)
 
     def _format_conversation_history(self):
-        if not self.conversation_history:
-            return "No previous conversation."
-        return "\n".join([f"{role.capitalize()}: {content}" for role, content in self.conversation_history[-5:]])
+        return self.conversation_history.format()
+
+    async def _summarize_history(self, summary: str, turns: list) -> str:
+        formatted_turns = "\n".join(f"{role.capitalize()}: {content}" for role, content in turns)
+        prompt = f"""
+        Goal: {self.goal}
+        Current summary of the conversation:
+        {summary or "No summary yet."}
+
+        New conversation turns to fold into the summary:
+        {formatted_turns}
+
+        Update the summary so that it covers the new turns as well. Keep the plans that were tried,
+        the errors that occurred and the facts learned so far. Drop anything irrelevant to the goal.
+        Keep the summary under {self.conversation_history.max_summary_tokens} tokens.
+
+        Updated summary:
+        """
+
+        return await self._chat(
+            "You are an AI assistant that maintains a concise running summary of an agent's conversation.",
+            prompt,
+            prompt_name="summarize_history"
+        )
 
     def _process_arg(self, arg, step_results):
-        if arg.startswith('[') and arg.endswith(']'):
-            step_ref = arg.strip('[]')
-            if step_ref.startswith('result from step'):
-                step_num = int(step_ref.split()[-1])
-                if f"result from step {step_num}" in step_results:
-                    result = step_results[f"result from step {step_num}"]
-                    if isinstance(result, str):
-                        # Try to parse the result as JSON
-                        try:
-                            json.loads(result)
-                            return result  # Return the JSON string if it's valid
-                        except json.JSONDecodeError:
-                            # If it's not valid JSON, proceed with the existing logic
-                            if "google_search.google_search result:" in result:
-                                lines = result.split('\n')
-                                for line in lines:
-                                    if 'http' in line or 'https' in line:
-                                        url = line.split()[-1].strip()
-                                        if url.startswith('http') or url.startswith('https'):
-                                            return url
-                            elif result.startswith('http'):
-                                return result.split('\n')[0].strip()
-                    return result
-        return arg.strip('"')  # Remove quotes from arguments
+        if isinstance(arg, StepRef):
+            result = step_results.get(f"result from step {arg.step}")
+            if result is None:
+                # A skipped or failed step leaves the reference as it was written
+                return str(arg)
+            if result.kind == "text" and result.blob is None and result.value.startswith('http'):
+                return result.value.split('\n')[0].strip()
+            # Rendered to text or JSON only if the receiving function asks for a string
+            return result
+        return arg
 
     def _is_valid_url(self, url):
         url_pattern = re.compile(
@@ -231,7 +600,7 @@ class Commander:
             r'(?:/?|[/?]\S+)$', re.IGNORECASE)
         return url is not None and url_pattern.match(url)
 
-    def _get_error_solution(self, error_message, module_name, function_name, args):
+    async def _get_error_solution(self, error_message, module_name, function_name, args):
         prompt = f"""
         An error occurred while executing a step in the plan:
         Module: {module_name}
@@ -253,20 +622,16 @@ class Commander:
         Solution:
         """
 
-        response = openai.ChatCompletion.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": "You are an AI assistant that helps solve errors in execution plans and suggests modifications to achieve the goal."},
-                {"role": "user", "content": prompt}
-            ]
+        solution = await self._chat(
+            "You are an AI assistant that helps solve errors in execution plans and suggests modifications to achieve the goal.",
+            prompt,
+            prompt_name="error_solution"
         )
-
-        solution = response.choices[0].message.content
-        self.conversation_history.append(("user", f"Error: {error_message}"))
-        self.conversation_history.append(("assistant", f"Solution: {solution}"))
+        self.conversation_history.add("user", f"Error: {error_message}")
+        self.conversation_history.add("assistant", f"Solution: {solution}")
         return solution
 
-    def _evaluate_step_result(self, result: str, step_index: int, remaining_steps: list) -> str:
+    async def _evaluate_step_result(self, result: str, step_index: int, remaining_steps: list) -> str:
         prompt = f"""
         Goal: {self.goal}
         Step result: {result}
@@ -284,35 +649,110 @@ class Commander:
         Response format:
         Explanation: [Your explanation here]
         Modified steps:
-        1. [Modified step 1]
-        2. [Modified step 2]
+        {STEP_FORMAT}
+        {STEP_FORMAT}
         ...
 
+        The modified steps replace every step after step {step_index + 1} and are numbered from {step_index + 2} on.
+        {STEP_FORMAT_RULES}
+
         Response:
         """
 
-        response = openai.ChatCompletion.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": "You are an AI assistant that evaluates execution results and suggests plan modifications if necessary to achieve the goal."},
-                {"role": "user", "content": prompt}
-            ]
+        return await self._chat(
+            "You are an AI assistant that evaluates execution results and suggests plan modifications if necessary to achieve the goal.",
+            prompt,
+            prompt_name="evaluate_step_result"
+        )
+
+    async def _evaluate_step_results(self, batch: list, remaining_steps: list) -> str:
+        last_index = batch[-1][0][0]
+        step_results = "\n".join(
+            f"Step {entry[0] + 1} ({entry[2]}.{entry[3]}): {module_result}" for entry, module_result in batch
         )
+        prompt = f"""
+        Goal: {self.goal}
+        Step results:
+        {step_results}
+        Current step index: {last_index}
+        Remaining steps in the plan:
+        {self._format_remaining_steps(remaining_steps[last_index+1:])}
+
+        Previous conversation and reasoning:
+        {self._format_conversation_history()}
 
-        return response.choices[0].message.content
+        Evaluate if these results compromise the initial plan or if the plan needs to be adapted.
+        If a modification is needed, provide a detailed explanation and the modified steps.
+        If no modification is needed, respond with "No modification needed."
+
+        Response format:
+        Explanation: [Your explanation here]
+        Modified steps:
+        {STEP_FORMAT}
+        {STEP_FORMAT}
+        ...
+
+        The modified steps replace every step after step {last_index + 1} and are numbered from {last_index + 2} on.
+        {STEP_FORMAT_RULES}
+
+        Response:
+        """
+
+        return await self._chat(
+            "You are an AI assistant that evaluates execution results and suggests plan modifications if necessary to achieve the goal.",
+            prompt,
+            prompt_name="evaluate_step_results"
+        )
 
     def _modify_plan(self, plan_steps: list, current_step: int, modification: str) -> list:
-        modified_steps = []
-        for line in modification.split('\n'):
-            if line.strip().startswith(('1.', '2.', '3.', '4.', '5.', '6.', '7.', '8.', '9.')):
-                modified_steps.append(line.split('.', 1)[1].strip())
-        
+        lines = section_lines(modification, "modified steps:") or modification.split('\n')
+        modified_steps = compile_steps(lines, self.agent.modules, start_number=current_step + 2)
         return plan_steps[:current_step+1] + modified_steps
 
     def _format_remaining_steps(self, steps: list) -> str:
-        return "\n".join(f"{i+1}. {step}" for i, step in enumerate(steps))
+        return "\n".join(f"{step.number}. {step}" for step in steps)
+
+    async def _reuse_plan(self, match: PlanMatch) -> str:
+        plan = f"Reasoning:\n1. Reusing the plan of a previous goal ({match.similarity:.0%} similar): {match.goal}\n\nPlan:\n{match.plan}"
+        try:
+            compile_plan(plan, self.agent.modules)
+        except PlanError:
+            return None  # The modules changed since the plan was stored
+        if not await self.approval.approve_plan_reuse(match.goal, match.similarity, match.plan):
+            return None
+        await asyncio.to_thread(self.plan_cache.record_use, match)
+        get_instrumentation().emit("plan_cache", "reuse", 0.0, similarity=match.similarity)
+        return plan
+
+    async def _create_plan(self) -> str:
+        plan, prompt = await self._plan_request()
+        if plan is not None:
+            return plan
+        return await self._chat(PLAN_SYSTEM_PROMPT, prompt, prompt_name="create_plan")
+
+    async def _stream_plan(self):
+        plan, prompt = await self._plan_request()
+        if plan is not None:
+            yield plan
+            return
+        async for chunk in self.llm.stream([
+            {"role": "system", "content": PLAN_SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ], prompt_name="create_plan"):
+            yield chunk
+
+    async def _plan_request(self) -> tuple:
+        # Either a reused plan or the prompt asking the model for a new one.
+        # A stored plan is only considered for the first attempt at a goal
+        match, self._plan_match = self._plan_match, None
+        if match and match.similarity >= self.plan_cache.reuse_threshold:
+            plan = await self._reuse_plan(match)
+            if plan:
+                return plan, None
+        similar_plan = ""
+        if match:
+            similar_plan = f"A similar goal was achieved before, adapt its plan where this goal differs:\n        Goal: {match.goal}\n        Plan:\n{match.plan}\n"
 
-    def _create_plan(self) -> str:
         available_modules = self.agent.list_modules()
         prompt = f"""
         Goal: {self.goal}
@@ -320,7 +760,7 @@ class Commander:
         {self._format_available_modules()}
 
         Workspace information:
-        - All files should be created or accessed in the '{WORKSPACE_DIR}' folder.
+        - All files should be created or accessed in the '{get_workspace_dir()}' folder.
         - When using file operations, provide only the filename, not the full path.
 
         Guidelines for creating the plan:
@@ -332,7 +772,10 @@ class Commander:
         6. Whenever possible, use JSON for data storage and manipulation. Use the json_operations module to work with JSON data.
         7. When fetching data from web sources, try to convert the results to JSON format using json_operations.to_json.
         8. When writing data to files, prefer JSON format for structured data.
+        9. To fetch several URLs (for example the links of a google_search result), use a single web_operations.fetch_many step instead of one make_get_request step per URL.
+        10. To read what a web page says, use web_operations.get_page_text, which returns its main text and links instead of raw HTML.
 
+        {similar_plan}
         Previous conversation and reasoning:
         {self._format_conversation_history()}
 
@@ -345,19 +788,13 @@ class Commander:
         ...
 
         Plan:
-        1. [Module name].[Function name], [Argument 1], [Argument 2], ...
-        2. [Module name].[Function name], [Argument 1], [Argument 2], ...
+        {STEP_FORMAT}
+        {STEP_FORMAT}
         ...
 
+        {STEP_FORMAT_RULES} Steps are numbered from 1 in the order they appear.
+
         Response:
         """
 
-        response = openai.ChatCompletion.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": "You are an AI assistant that creates detailed, step-by-step plans to achieve goals using available modules and functions. Analyze the modules and their functions carefully to determine the best approach. Learn from previous interactions and errors to improve your plans. Prefer working with JSON data whenever possible."},
-                {"role": "user", "content": prompt}
-            ]
-        )
-
-        return response.choices[0].message.content
\ No newline at end of file
+        return None, prompt
\ No newline at end of file
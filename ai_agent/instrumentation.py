@@ -0,0 +1,109 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+class JSONLTraceWriter:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8")
+
+    def __call__(self, event: dict):
+        line = json.dumps(event, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+class Instrumentation:
+    def __init__(self):
+        self.hooks = []
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def add_hook(self, hook):
+        self.hooks.append(hook)
+        return hook
+
+    def remove_hook(self, hook):
+        self.hooks.remove(hook)
+
+    def emit(self, kind: str, name: str, duration: float, **fields):
+        event = {"timestamp": time.time(), "kind": kind, "name": name, "duration": duration, **fields}
+        with self._lock:
+            stats = self._stats.setdefault((kind, name), {
+                "durations": [], "prompt_tokens": 0, "completion_tokens": 0, "result_size": 0, "errors": 0
+            })
+            stats["durations"].append(duration)
+            stats["prompt_tokens"] += fields.get("prompt_tokens") or 0
+            stats["completion_tokens"] += fields.get("completion_tokens") or 0
+            stats["result_size"] += fields.get("result_size") or 0
+            stats["errors"] += 1 if fields.get("error") else 0
+        for hook in list(self.hooks):
+            hook(event)
+
+    @contextmanager
+    def timer(self, kind: str, name: str, **fields):
+        # The yielded dict can be filled in by the caller before the event is emitted
+        start = time.perf_counter()
+        try:
+            yield fields
+        except BaseException as e:
+            fields["error"] = type(e).__name__
+            raise
+        finally:
+            self.emit(kind, name, time.perf_counter() - start, **fields)
+
+    def summary(self) -> list:
+        rows = []
+        with self._lock:
+            items = [(key, dict(stats, durations=sorted(stats["durations"]))) for key, stats in self._stats.items()]
+        for (kind, name), stats in sorted(items):
+            durations = stats["durations"]
+            rows.append({
+                "kind": kind,
+                "name": name,
+                "count": len(durations),
+                "total": sum(durations),
+                "mean": sum(durations) / len(durations),
+                "p95": durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+                "prompt_tokens": stats["prompt_tokens"],
+                "completion_tokens": stats["completion_tokens"],
+                "result_size": stats["result_size"],
+                "errors": stats["errors"]
+            })
+        return rows
+
+    def report(self) -> str:
+        lines = [f"{'kind':<10} {'name':<40} {'count':>6} {'total s':>9} {'mean ms':>9} {'p95 ms':>9} {'tokens in/out':>15} {'errors':>6}"]
+        for row in self.summary():
+            tokens = f"{row['prompt_tokens']}/{row['completion_tokens']}"
+            lines.append(
+                f"{row['kind']:<10} {row['name'][:40]:<40} {row['count']:>6} {row['total']:>9.3f} "
+                f"{row['mean'] * 1000:>9.1f} {row['p95'] * 1000:>9.1f} {tokens:>15} {row['errors']:>6}"
+            )
+        return "\n".join(lines)
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+
+_instrumentation = None
+_instrumentation_lock = threading.Lock()
+
+def get_instrumentation() -> Instrumentation:
+    global _instrumentation
+    if _instrumentation is None:
+        with _instrumentation_lock:
+            if _instrumentation is None:
+                instrumentation = Instrumentation()
+                trace_file = os.getenv("AGENT_TRACE_FILE")
+                if trace_file:
+                    instrumentation.add_hook(JSONLTraceWriter(trace_file))
+                _instrumentation = instrumentation
+    return _instrumentation
@@ -0,0 +1,138 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+import weakref
+import openai
+from .cache import DiskCache
+from .instrumentation import get_instrumentation
+from .scheduler import RequestScheduler, estimate_tokens, get_scheduler
+
+CACHE_MODES = ("off", "readwrite", "record", "replay")
+
+class CacheMissError(LookupError):
+    pass
+
+def cache_from_env():
+    path = os.getenv("AGENT_LLM_CACHE")
+    if not path:
+        return None
+    max_mb = float(os.getenv("AGENT_LLM_CACHE_MAX_MB", "0"))
+    ttl = float(os.getenv("AGENT_LLM_CACHE_TTL", "0"))
+    return DiskCache(path, max_bytes=int(max_mb * 1024 * 1024) or None, ttl=ttl or None)
+
+def models_from_env() -> dict:
+    # e.g. OPENAI_MODELS="evaluate_step_result=gpt-4o-mini,create_plan=gpt-4o"
+    models = {}
+    for entry in os.getenv("OPENAI_MODELS", "").split(","):
+        prompt_name, _, model = entry.partition("=")
+        if prompt_name.strip() and model.strip():
+            models[prompt_name.strip()] = model.strip()
+    return models
+
+class ChatClient:
+    def __init__(self, model: str = None, max_concurrency: int = None, cache: DiskCache = None, cache_mode: str = None,
+                 models: dict = None, scheduler: RequestScheduler = None, coalesce: bool = True):
+        self.model = model or os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+        # Prompt names without an entry use the default model
+        self.models = models if models is not None else models_from_env()
+        self.scheduler = scheduler or get_scheduler()
+        self.coalesce = coalesce
+        self.max_concurrency = max_concurrency or int(os.getenv("OPENAI_MAX_CONCURRENCY", "8"))
+        self.cache = cache if cache is not None else cache_from_env()
+        self.cache_mode = cache_mode or os.getenv("AGENT_LLM_CACHE_MODE", "readwrite")
+        if self.cache_mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode '{self.cache_mode}', expected one of {', '.join(CACHE_MODES)}")
+        if self.cache_mode == "replay" and self.cache is None:
+            raise ValueError("Replay mode requires a completion cache (set AGENT_LLM_CACHE)")
+        # asyncio primitives are bound to the loop they are first used on
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if loop not in self._semaphores:
+            self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphores[loop]
+
+    def model_for(self, prompt_name: str = None) -> str:
+        return self.models.get(prompt_name, self.model)
+
+    def _cache_key(self, model: str, messages: list, params: dict) -> str:
+        payload = json.dumps({"model": model, "messages": messages, "params": params}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    async def complete(self, messages: list, prompt_name: str = None, **params) -> str:
+        model = self.model_for(prompt_name)
+        with get_instrumentation().timer("llm", prompt_name or "chat", model=model, cached=False) as event:
+            key = self._cache_key(model, messages, params)
+            use_cache = self.cache is not None and self.cache_mode != "off"
+            if use_cache and self.cache_mode in ("readwrite", "replay"):
+                cached = self.cache.get(key, allow_expired=self.cache_mode == "replay")
+                if cached is not None:
+                    event["cached"] = True
+                    return cached[0].decode("utf-8")
+            if self.cache_mode == "replay":
+                raise CacheMissError(f"No recorded completion for prompt {key[:12]} in replay mode")
+
+            async def call():
+                async with self._semaphore():
+                    return await openai.ChatCompletion.acreate(model=model, messages=messages, **params)
+
+            response = await self.scheduler.submit(
+                call,
+                tokens=estimate_tokens(messages, params),
+                key=key if self.coalesce else None,
+                stats=event
+            )
+            content = response.choices[0].message.content
+            usage = response.get("usage") or {}
+            event["prompt_tokens"] = None if event.get("coalesced") else usage.get("prompt_tokens")
+            event["completion_tokens"] = None if event.get("coalesced") else usage.get("completion_tokens")
+
+            if use_cache:
+                self.cache.put(key, content.encode("utf-8"), {"model": model})
+            return content
+
+    async def stream(self, messages: list, prompt_name: str = None, **params):
+        # Yields the completion as it is generated, cached completions arrive in one piece
+        model = self.model_for(prompt_name)
+        with get_instrumentation().timer("llm", prompt_name or "chat", model=model, cached=False, streamed=True) as event:
+            key = self._cache_key(model, messages, params)
+            use_cache = self.cache is not None and self.cache_mode != "off"
+            if use_cache and self.cache_mode in ("readwrite", "replay"):
+                cached = self.cache.get(key, allow_expired=self.cache_mode == "replay")
+                if cached is not None:
+                    event["cached"] = True
+                    yield cached[0].decode("utf-8")
+                    return
+            if self.cache_mode == "replay":
+                raise CacheMissError(f"No recorded completion for prompt {key[:12]} in replay mode")
+
+            start = time.perf_counter()
+            parts = []
+            # The slot is held until the last token, retries only happen before the first one
+            async with self._semaphore():
+                response = await self.scheduler.submit(
+                    lambda: openai.ChatCompletion.acreate(model=model, messages=messages, stream=True, **params),
+                    tokens=estimate_tokens(messages, params),
+                    stats=event
+                )
+                try:
+                    async for chunk in response:
+                        content = chunk.choices[0].get("delta", {}).get("content") if chunk.choices else None
+                        if not content:
+                            continue
+                        if not parts:
+                            event["first_token"] = time.perf_counter() - start
+                        parts.append(content)
+                        yield content
+                except GeneratorExit:
+                    event["closed"] = True  # The caller stopped reading, an incomplete completion is not cached
+                    return
+                finally:
+                    if hasattr(response, "aclose"):
+                        await response.aclose()
+
+            if use_cache:
+                self.cache.put(key, "".join(parts).encode("utf-8"), {"model": model})
@@ -0,0 +1,71 @@
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from .results import StepResult
+from .workspace import workspace_path
+
+ERROR_RESULT_PATTERN = re.compile(r'^\s*(Error|Unexpected error)')
+MAX_PATH_LENGTH = 255
+
+def file_signature(args: list) -> tuple:
+    # String arguments naming workspace files tie an entry to the files' state, missing files included
+    signature = []
+    for arg in args:
+        if not isinstance(arg, str) or not arg or len(arg) > MAX_PATH_LENGTH or "\n" in arg:
+            continue
+        path = workspace_path(arg)
+        try:
+            stat = os.stat(path)
+            signature.append((path, stat.st_mtime_ns, stat.st_size))
+        except (OSError, ValueError):
+            signature.append((path, None, None))
+    return tuple(signature)
+
+class StepMemo:
+    def __init__(self, max_entries: int = None):
+        self.max_entries = max_entries or int(os.getenv("AGENT_STEP_MEMO_SIZE", "256"))
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _key(self, module_name: str, function_name: str, args: list) -> str:
+        try:
+            return json.dumps([module_name, function_name, list(args)], sort_keys=True)
+        except (TypeError, ValueError):
+            return None  # Arguments that are not plain data are never matched
+
+    def lookup(self, module_name: str, function_name: str, args: list):
+        # The file signature is taken before the step runs, so a result is never tied to a later file state
+        key = self._key(module_name, function_name, args)
+        if key is None:
+            return None, None, None
+        signature = file_signature(args)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != signature:
+                self.misses += 1
+                return key, signature, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return key, signature, entry[1]
+
+    def store(self, key: str, signature: tuple, result: StepResult):
+        # Failures are retried rather than remembered
+        if key is None or (result.blob is None and isinstance(result.value, str) and ERROR_RESULT_PATTERN.match(result.value)):
+            return
+        with self._lock:
+            self._entries[key] = (signature, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
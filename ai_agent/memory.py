@@ -0,0 +1,97 @@
+import os
+import re
+from collections import deque
+
+WORD_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+class Tokenizer:
+    def __init__(self, model: str = None):
+        # tiktoken gives exact counts when installed, otherwise words and punctuation approximate tokens
+        try:
+            import tiktoken
+            try:
+                self._encoding = tiktoken.encoding_for_model(model or "gpt-3.5-turbo")
+            except KeyError:
+                self._encoding = tiktoken.get_encoding("cl100k_base")
+        except ImportError:
+            self._encoding = None
+
+    def count(self, text: str) -> int:
+        if self._encoding is not None:
+            return len(self._encoding.encode(text))
+        return len(WORD_PATTERN.findall(text))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if self.count(text) <= max_tokens:
+            return text
+        if self._encoding is not None:
+            return self._encoding.decode(self._encoding.encode(text)[:max_tokens]) + " ... [truncated]"
+        cut = [match.end() for _, match in zip(range(max_tokens), WORD_PATTERN.finditer(text))]
+        return text[:cut[-1] if cut else 0] + " ... [truncated]"
+
+class ConversationMemory:
+    def __init__(self, token_budget: int = None, max_entry_tokens: int = None, max_summary_tokens: int = None,
+                 tokenizer: Tokenizer = None):
+        self.token_budget = token_budget or int(os.getenv("AGENT_MEMORY_TOKENS", "2000"))
+        self.max_entry_tokens = max_entry_tokens or int(os.getenv("AGENT_MEMORY_ENTRY_TOKENS", str(self.token_budget // 4)))
+        self.max_summary_tokens = max_summary_tokens or self.token_budget // 4
+        self.tokenizer = tokenizer or Tokenizer()
+        self.turns = deque()
+        self.summary = ""
+        self.summary_tokens = 0
+        self.turn_tokens = 0
+        # Turns dropped from the window that are not part of the summary yet
+        self.evicted = []
+
+    def add(self, role: str, content: str):
+        content = self.tokenizer.truncate(str(content), self.max_entry_tokens)
+        tokens = self.tokenizer.count(f"{role}: {content}")
+        self.turns.append((role, content, tokens))
+        self.turn_tokens += tokens
+        self._evict()
+
+    def _evict(self):
+        # The newest turn always stays, however large
+        while len(self.turns) > 1 and self.turn_tokens + self.summary_tokens > self.token_budget:
+            role, content, tokens = self.turns.popleft()
+            self.turn_tokens -= tokens
+            self.evicted.append((role, content))
+
+    async def fold(self, summarize):
+        # Only the turns evicted since the last fold are sent, the summary is never rebuilt
+        if not self.evicted:
+            return
+        evicted, self.evicted = self.evicted, []
+        summary = await summarize(self.summary, evicted)
+        self.summary = self.tokenizer.truncate(summary.strip(), self.max_summary_tokens)
+        self.summary_tokens = self.tokenizer.count(self.summary)
+        self._evict()
+
+    def snapshot(self) -> dict:
+        return {
+            "turns": [[role, content] for role, content, _ in self.turns],
+            "summary": self.summary,
+            "evicted": [list(turn) for turn in self.evicted]
+        }
+
+    def restore(self, snapshot: dict):
+        self.turns = deque((role, content, self.tokenizer.count(f"{role}: {content}")) for role, content in snapshot["turns"])
+        self.turn_tokens = sum(tokens for _, _, tokens in self.turns)
+        self.summary = snapshot["summary"]
+        self.summary_tokens = self.tokenizer.count(self.summary)
+        self.evicted = [tuple(turn) for turn in snapshot["evicted"]]
+
+    def format(self) -> str:
+        if not self.turns and not self.summary:
+            return "No previous conversation."
+        lines = []
+        if self.summary:
+            lines.append(f"Summary of earlier conversation: {self.summary}")
+        lines.extend(f"{role.capitalize()}: {content}" for role, content, _ in self.turns)
+        return "\n".join(lines)
+
+    def __len__(self):
+        return len(self.turns)
+
+    def __iter__(self):
+        return ((role, content) for role, content, _ in self.turns)
@@ -1,12 +1,53 @@
+import ast
+import importlib
+import inspect
+import threading
+from functools import lru_cache
 from typing import Callable
 
+ENTRY_POINT_GROUP = "ai_agent.modules"
+
+@lru_cache(maxsize=None)
+def parse_signature(text: str) -> inspect.Signature:
+    # "(path: str, limit: str = '50') -> str" without importing or evaluating the annotations
+    arguments = ast.parse(f"def f{text}: pass").body[0].args
+    positional = arguments.posonlyargs + arguments.args
+    defaults = [inspect.Parameter.empty] * (len(positional) - len(arguments.defaults)) + arguments.defaults
+    parameters = [
+        inspect.Parameter(arg.arg, inspect.Parameter.POSITIONAL_ONLY if arg in arguments.posonlyargs
+                          else inspect.Parameter.POSITIONAL_OR_KEYWORD, default=default)
+        for arg, default in zip(positional, defaults)
+    ]
+    if arguments.vararg:
+        parameters.append(inspect.Parameter(arguments.vararg.arg, inspect.Parameter.VAR_POSITIONAL))
+    for arg, default in zip(arguments.kwonlyargs, arguments.kw_defaults):
+        parameters.append(inspect.Parameter(arg.arg, inspect.Parameter.KEYWORD_ONLY,
+                                            default=inspect.Parameter.empty if default is None else default))
+    if arguments.kwarg:
+        parameters.append(inspect.Parameter(arguments.kwarg.arg, inspect.Parameter.VAR_KEYWORD))
+    return inspect.Signature(parameters)
+
 class Module:
+    loaded = True
+
     def __init__(self, name):
         self.name = name
         self.functions = {}
+        self.idempotent = set()
+        self.unmemoized = set()
 
-    def add_function(self, name, function):
+    def add_function(self, name, function, idempotent: bool = False, memoize: bool = True):
+        # Idempotent functions have no side effects, repeated calls with the same arguments may reuse a result.
+        # memoize=False keeps that from happening, e.g. for results only valid while something else lives.
         self.functions[name] = function
+        if idempotent:
+            self.idempotent.add(name)
+        else:
+            self.idempotent.discard(name)
+        if memoize:
+            self.unmemoized.discard(name)
+        else:
+            self.unmemoized.add(name)
 
     def execute(self, function_name, *args):
         if function_name in self.functions:
@@ -15,4 +56,94 @@ class Module:
             raise ValueError(f"Function '{function_name}' not found in module '{self.name}'")
 
     def list_functions(self):
-        return list(self.functions.keys())
\ No newline at end of file
+        return list(self.functions.keys())
+
+    def get_function(self, function_name) -> Callable:
+        return self.functions.get(function_name)
+
+    def is_idempotent(self, function_name) -> bool:
+        return function_name in self.idempotent
+
+    def is_memoizable(self, function_name) -> bool:
+        return function_name in self.idempotent and function_name not in self.unmemoized
+
+    def signature(self, function_name) -> inspect.Signature:
+        return inspect.signature(self.get_function(function_name))
+
+    def describe_function(self, function_name) -> str:
+        try:
+            return f"{function_name}{inspect.signature(self.functions[function_name])}"
+        except (TypeError, ValueError):
+            return function_name
+
+class LazyModule(Module):
+    # Registered by name, the target "package.module:attribute" is imported on first use.
+    # Given function signatures, plans can be written and checked without importing it.
+    def __init__(self, name, target: str, functions: dict = None):
+        self.name = name
+        self.target = target
+        self.signatures = dict(functions) if functions is not None else None
+        self._module = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+
+    def load(self) -> Module:
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    module_path, _, attribute = self.target.partition(":")
+                    module = getattr(importlib.import_module(module_path), attribute)
+                    if isinstance(module, LazyModule):
+                        module = module.load()
+                    missing = set(self.signatures or ()) - set(module.list_functions())
+                    if missing:
+                        raise ImportError(f"Module '{self.name}' ({self.target}) has no functions {', '.join(sorted(missing))}")
+                    self._module = module
+        return self._module
+
+    @property
+    def functions(self) -> dict:
+        return self.load().functions
+
+    def add_function(self, name, function, idempotent: bool = False, memoize: bool = True):
+        self.load().add_function(name, function, idempotent, memoize)
+
+    def execute(self, function_name, *args):
+        return self.load().execute(function_name, *args)
+
+    def list_functions(self):
+        if self._module is None and self.signatures is not None:
+            return list(self.signatures)
+        return self.load().list_functions()
+
+    def get_function(self, function_name) -> Callable:
+        return self.load().get_function(function_name)
+
+    def is_idempotent(self, function_name) -> bool:
+        return self.load().is_idempotent(function_name)
+
+    def is_memoizable(self, function_name) -> bool:
+        return self.load().is_memoizable(function_name)
+
+    def signature(self, function_name) -> inspect.Signature:
+        if self._module is None and self.signatures and self.signatures.get(function_name):
+            return parse_signature(self.signatures[function_name])
+        return self.load().signature(function_name)
+
+    def describe_function(self, function_name) -> str:
+        if self._module is None and self.signatures and self.signatures.get(function_name):
+            return f"{function_name}{self.signatures[function_name]}"
+        return self.load().describe_function(function_name)
+
+def discover_modules(group: str = ENTRY_POINT_GROUP) -> list:
+    # Plugins declare e.g. `[project.entry-points."ai_agent.modules"] weather = "weather_plugin:weather_module"`,
+    # nothing is imported until the module is used
+    from importlib.metadata import entry_points
+    try:
+        found = entry_points(group=group)
+    except TypeError:
+        found = entry_points().get(group, [])
+    return [LazyModule(entry_point.name, entry_point.value) for entry_point in found]
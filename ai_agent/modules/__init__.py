@@ -1,9 +1,41 @@
-from .file_operations import file_operations_module
-from .web_operations import web_operations_module
-from .json_operations import json_operations_module
+from ..module import LazyModule
+
+# Signatures let plans be written and validated before a module's dependencies are imported
+file_operations_module = LazyModule("file_operations", f"{__name__}.file_operations:file_operations_module", {
+    "read_file": "(file_path: str) -> str",
+    "read_file_range": "(file_path: str, offset: str, length: str) -> str",
+    "read_chunk": "(file_path: str, chunk_index: str, chunk_size: str = None) -> str",
+    "read_lines": "(file_path: str, start_line: str, num_lines: str = '100') -> str",
+    "search_file": "(file_path: str, pattern: str, max_results: str = '50') -> str",
+    "write_file": "(file_path: str, content: str) -> str",
+    "append_file": "(file_path: str, content: str) -> str"
+})
+
+web_operations_module = LazyModule("web_operations", f"{__name__}.web_operations:web_operations_module", {
+    "make_get_request": "(url: str, max_chars: str = None) -> str",
+    "make_post_request": "(url: str, data: str) -> str",
+    "get_response_window": "(url: str, offset: str, length: str) -> str",
+    "fetch_many": "(urls: Union[str, list], max_chars: str = None, timeout: str = None) -> str",
+    "get_page_text": "(url: str, max_tokens: str = None) -> str"
+})
+
+json_operations_module = LazyModule("json_operations", f"{__name__}.json_operations:json_operations_module", {
+    "parse_json": "(json_string: Union[str, dict, list]) -> str",
+    "get_json_value": "(json_string: Union[str, dict, list], key: str) -> str",
+    "query_json": "(json_string: Union[str, dict, list], path: str) -> str",
+    "load_json": "(json_string: Union[str, dict, list]) -> str",
+    "load_json_file": "(file_path: str) -> str",
+    "query_json_file": "(file_path: str, path: str, max_results: str = '100') -> str",
+    "create_json": "(key_value_pairs: str) -> str",
+    "to_json": "(input_string: str) -> str"
+})
+
+google_search_module = LazyModule("google_search", f"{__name__}.google_search_operation:google_search_module", {
+    "google_search": "(query: str, num_results: int = 5) -> str"
+})
 
 all_modules = [
     file_operations_module,
     web_operations_module,
     json_operations_module
-]
\ No newline at end of file
+]
@@ -1,19 +1,21 @@
+import itertools
+import mmap
 import os
+import re
 from ..module import Module
+from ..workspace import ensure_workspace_exists, workspace_path
 
-WORKSPACE_DIR = "workspace"
+MAX_READ_BYTES = int(os.getenv("AGENT_FILE_MAX_READ_BYTES", str(1024 * 1024)))
+MMAP_THRESHOLD = int(os.getenv("AGENT_FILE_MMAP_THRESHOLD", str(4 * 1024 * 1024)))
+DEFAULT_CHUNK_SIZE = 64 * 1024
+NEWLINE_COUNT_WINDOW = 1024 * 1024
 
-def ensure_workspace_exists():
-    if not os.path.exists(WORKSPACE_DIR):
-        os.makedirs(WORKSPACE_DIR)
-
-def sanitize_filename(filename):
-    return os.path.normpath(filename).lstrip(os.sep)
+def _decode(data: bytes) -> str:
+    return data.decode("utf-8", errors="replace")
 
 def read_file(file_path: str) -> str:
     ensure_workspace_exists()
-    safe_path = sanitize_filename(file_path)
-    full_path = os.path.join(WORKSPACE_DIR, safe_path)
+    full_path = workspace_path(file_path)
     try:
         if not os.path.exists(full_path):
             return f"Error: File '{full_path}' does not exist."
@@ -23,10 +25,151 @@ def read_file(file_path: str) -> str:
     except Exception as e:
         return f"Error reading file '{full_path}': {str(e)}"
 
+def read_file_range(file_path: str, offset: str, length: str) -> str:
+    full_path = workspace_path(file_path)
+    try:
+        if not os.path.exists(full_path):
+            return f"Error: File '{full_path}' does not exist."
+        offset, length = int(offset), min(int(length), MAX_READ_BYTES)
+        size = os.path.getsize(full_path)
+        if offset < 0 or length <= 0:
+            return f"Error: Invalid range offset={offset}, length={length}"
+        if offset >= size:
+            return f"Error: Offset {offset} is beyond the end of '{full_path}' ({size} bytes)"
+        with open(full_path, 'rb') as file:
+            if size >= MMAP_THRESHOLD:
+                # Only the pages covering the range are read from disk
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    data = mapped[offset:offset + length]
+            else:
+                file.seek(offset)
+                data = file.read(length)
+        return f"Bytes {offset}-{offset + len(data) - 1} of '{full_path}' ({size} bytes):\n{_decode(data)}"
+    except ValueError as e:
+        return f"Error: Invalid range for '{full_path}': {str(e)}"
+    except Exception as e:
+        return f"Error reading file '{full_path}': {str(e)}"
+
+def read_chunk(file_path: str, chunk_index: str, chunk_size: str = None) -> str:
+    full_path = workspace_path(file_path)
+    try:
+        if not os.path.exists(full_path):
+            return f"Error: File '{full_path}' does not exist."
+        chunk_index, chunk_size = int(chunk_index), int(chunk_size or DEFAULT_CHUNK_SIZE)
+        chunks = max(1, -(-os.path.getsize(full_path) // chunk_size))
+        if not 0 <= chunk_index < chunks:
+            return f"Error: Chunk {chunk_index} out of range, '{full_path}' has {chunks} chunks of {chunk_size} bytes"
+        return f"Chunk {chunk_index + 1} of {chunks}. " + read_file_range(file_path, chunk_index * chunk_size, chunk_size)
+    except ValueError as e:
+        return f"Error: Invalid chunk for '{full_path}': {str(e)}"
+    except Exception as e:
+        return f"Error reading file '{full_path}': {str(e)}"
+
+def read_lines(file_path: str, start_line: str, num_lines: str = "100") -> str:
+    full_path = workspace_path(file_path)
+    try:
+        if not os.path.exists(full_path):
+            return f"Error: File '{full_path}' does not exist."
+        start_line, num_lines = int(start_line), int(num_lines)
+        if start_line < 1 or num_lines <= 0:
+            return f"Error: Invalid line range start_line={start_line}, num_lines={num_lines}"
+        lines = []
+        read_bytes = 0
+        with open(full_path, 'rb') as file:
+            skip = start_line - 1
+            if skip and os.path.getsize(full_path) >= MMAP_THRESHOLD:
+                # Newlines are counted a window at a time on the mapping instead of iterating line by line
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    offset = _line_offset(mapped, skip)
+                if offset < 0:
+                    return f"Error: '{full_path}' has fewer than {start_line} lines"
+                file.seek(offset)
+                skip = 0
+            for line in itertools.islice(file, skip, skip + num_lines):
+                read_bytes += len(line)
+                if read_bytes > MAX_READ_BYTES:
+                    break
+                lines.append(_decode(line))
+        if not lines:
+            return f"Error: '{full_path}' has fewer than {start_line} lines"
+        return f"Lines {start_line}-{start_line + len(lines) - 1} of '{full_path}':\n{''.join(lines)}"
+    except ValueError as e:
+        return f"Error: Invalid line range for '{full_path}': {str(e)}"
+    except Exception as e:
+        return f"Error reading file '{full_path}': {str(e)}"
+
+def iter_chunks(file_path: str, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    with open(workspace_path(file_path), 'rb') as file:
+        while True:
+            chunk = file.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+def _line_offset(mapped, lines: int) -> int:
+    position = 0
+    while lines > 0:
+        window = mapped[position:position + NEWLINE_COUNT_WINDOW]
+        if not window:
+            return -1
+        count = window.count(b'\n')
+        if count < lines:
+            lines -= count
+            position += len(window)
+            continue
+        for _ in range(lines):
+            position = mapped.find(b'\n', position) + 1
+        return position
+    return position
+
+def _count_newlines(mapped, start: int, end: int) -> int:
+    count = 0
+    for position in range(start, end, NEWLINE_COUNT_WINDOW):
+        count += mapped[position:min(end, position + NEWLINE_COUNT_WINDOW)].count(b'\n')
+    return count
+
+def search_file(file_path: str, pattern: str, max_results: str = "50") -> str:
+    full_path = workspace_path(file_path)
+    try:
+        if not os.path.exists(full_path):
+            return f"Error: File '{full_path}' does not exist."
+        max_results = int(max_results)
+        # Line anchors match at every line, as in grep, not only at the ends of the file
+        try:
+            regex = re.compile(pattern.encode("utf-8"), re.MULTILINE)
+        except re.error:
+            regex = re.compile(re.escape(pattern.encode("utf-8")))
+        if os.path.getsize(full_path) == 0:
+            return f"No matches for '{pattern}' in '{full_path}'"
+
+        matches = []
+        with open(full_path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            # The regex scans the mapping directly, only matching lines become strings
+            line_number, counted_to, position = 1, 0, 0
+            while len(matches) < max_results:
+                match = regex.search(mapped, position)
+                if not match:
+                    break
+                line_start = mapped.rfind(b'\n', 0, match.start()) + 1
+                line_end = mapped.find(b'\n', match.end())
+                line_end = len(mapped) if line_end == -1 else line_end
+                line_number += _count_newlines(mapped, counted_to, line_start)
+                counted_to = line_start
+                matches.append(f"{line_number}: {_decode(mapped[line_start:line_end]).rstrip()}")
+                position = line_end + 1
+                if position > len(mapped):
+                    break
+        if not matches:
+            return f"No matches for '{pattern}' in '{full_path}'"
+        return f"Matches for '{pattern}' in '{full_path}':\n" + "\n".join(matches)
+    except ValueError as e:
+        return f"Error: Invalid search for '{full_path}': {str(e)}"
+    except Exception as e:
+        return f"Error searching file '{full_path}': {str(e)}"
+
 def write_file(file_path: str, content: str) -> str:
     ensure_workspace_exists()
-    safe_path = sanitize_filename(file_path)
-    full_path = os.path.join(WORKSPACE_DIR, safe_path)
+    full_path = workspace_path(file_path)
     try:
         with open(full_path, 'w') as file:
             file.write(content)
@@ -34,6 +177,32 @@ def write_file(file_path: str, content: str) -> str:
     except Exception as e:
         return f"Error writing to file '{full_path}': {str(e)}"
 
+def append_file(file_path: str, content: str) -> str:
+    ensure_workspace_exists()
+    full_path = workspace_path(file_path)
+    try:
+        with open(full_path, 'a') as file:
+            file.write(content)
+        return f"Successfully appended {len(content)} characters to '{full_path}'"
+    except Exception as e:
+        return f"Error appending to file '{full_path}': {str(e)}"
+
+def write_chunks(file_path: str, chunks, append: bool = False) -> int:
+    # Streams an iterable of str or bytes to a workspace file without joining it in memory
+    ensure_workspace_exists()
+    written = 0
+    with open(workspace_path(file_path), 'ab' if append else 'wb') as file:
+        for chunk in chunks:
+            data = chunk.encode("utf-8") if isinstance(chunk, str) else chunk
+            file.write(data)
+            written += len(data)
+    return written
+
 file_operations_module = Module("file_operations")
-file_operations_module.add_function("read_file", read_file)
-file_operations_module.add_function("write_file", write_file)
\ No newline at end of file
+file_operations_module.add_function("read_file", read_file, idempotent=True)
+file_operations_module.add_function("read_file_range", read_file_range, idempotent=True)
+file_operations_module.add_function("read_chunk", read_chunk, idempotent=True)
+file_operations_module.add_function("read_lines", read_lines, idempotent=True)
+file_operations_module.add_function("search_file", search_file, idempotent=True)
+file_operations_module.add_function("write_file", write_file)
+file_operations_module.add_function("append_file", append_file)
@@ -1,6 +1,76 @@
+import os
+from importlib.util import find_spec
 import requests
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 from ..module import Module
+from . import http_cache
+
+HTML_PARSER = os.getenv("AGENT_HTML_PARSER", "auto")
+
+def extract_with_selectolax(html: str, num_results: int) -> list:
+    from selectolax.lexbor import LexborHTMLParser
+    results = []
+    for container in LexborHTMLParser(html).css("div.g"):
+        title_element = container.css_first("h3")
+        link_element = container.css_first("a")
+        if title_element is not None and link_element is not None:
+            results.append((title_element.text(), link_element.attributes.get("href") or ""))
+        if len(results) >= num_results:
+            break
+    return results
+
+def is_result_container_class(value) -> bool:
+    # While parsing, the class attribute has not been split into a list yet
+    if not value:
+        return False
+    return 'g' in (value.split() if isinstance(value, str) else value)
+
+def extract_with_soup(html: str, num_results: int, parser: str = "html.parser", restrict: bool = True) -> list:
+    # Only build the tree for result containers instead of the whole page
+    parse_only = SoupStrainer('div', class_=is_result_container_class) if restrict else None
+    soup = BeautifulSoup(html, parser, parse_only=parse_only)
+    results = []
+    for container in soup.find_all('div', class_='g'):
+        title_element = container.find('h3')
+        link_element = container.find('a')
+        if title_element and link_element:
+            results.append((title_element.text, link_element.get('href') or ""))
+        if len(results) >= num_results:
+            break
+    return results
+
+def extract_with_lxml(html: str, num_results: int) -> list:
+    return extract_with_soup(html, num_results, parser="lxml")
+
+def extract_with_full_parse(html: str, num_results: int) -> list:
+    return extract_with_soup(html, num_results, restrict=False)
+
+# Preferred order for "auto", each entry names the package it needs
+RESULT_EXTRACTORS = {
+    "selectolax": (extract_with_selectolax, "selectolax"),
+    "lxml": (extract_with_lxml, "lxml"),
+    "html.parser": (extract_with_soup, None),
+    "full": (extract_with_full_parse, None),
+}
+
+def available_extractors() -> list:
+    return [name for name, (_, package) in RESULT_EXTRACTORS.items() if package is None or find_spec(package)]
+
+def get_extractor(name: str = None):
+    name = name or HTML_PARSER
+    if name == "auto":
+        name = available_extractors()[0]
+    if name not in RESULT_EXTRACTORS:
+        raise ValueError(f"Unknown HTML parser '{name}', expected one of auto, {', '.join(RESULT_EXTRACTORS)}")
+    return RESULT_EXTRACTORS[name][0]
+
+def extract_results(html: str, num_results: int, parser: str = None) -> list:
+    results = []
+    for title, link in get_extractor(parser)(html, num_results):
+        if link.startswith('/url?q='):
+            link = link.split('/url?q=')[1].split('&')[0]
+        results.append((title, link))
+    return results
 
 def google_search(query: str, num_results: int = 5) -> str:
     try:
@@ -8,30 +78,17 @@ def google_search(query: str, num_results: int = 5) -> str:
         headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
         }
-        response = requests.get(url, headers=headers)
+        response = http_cache.cached_get(url, headers=headers)
         response.raise_for_status()
 
-        soup = BeautifulSoup(response.text, 'html.parser')
-        search_results = soup.find_all('div', class_='g')
-        
-        results = []
-        for i, result in enumerate(search_results[:num_results], 1):
-            title_element = result.find('h3')
-            link_element = result.find('a')
-            
-            if title_element and link_element:
-                title = title_element.text
-                link = link_element.get('href')
-                if link.startswith('/url?q='):
-                    link = link.split('/url?q=')[1].split('&')[0]
-                results.append(f"{i}. {title}\n   {link}\n")
-            
-            if len(results) >= num_results:
-                break
+        results = [
+            f"{i}. {title}\n   {link}\n"
+            for i, (title, link) in enumerate(extract_results(response.text(), int(num_results)), 1)
+        ]
 
         if not results:
             return "No search results found."
-        
+
         return "\n".join(results)
     except requests.RequestException as e:
         return f"Error performing Google search: {str(e)}"
@@ -39,4 +96,4 @@ def google_search(query: str, num_results: int = 5) -> str:
         return f"Unexpected error during Google search: {str(e)}"
 
 google_search_module = Module("google_search")
-google_search_module.add_function("google_search", google_search)
\ No newline at end of file
+google_search_module.add_function("google_search", google_search, idempotent=True)
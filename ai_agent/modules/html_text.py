@@ -0,0 +1,210 @@
+import codecs
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from html.parser import HTMLParser
+from urllib.parse import urljoin, urlparse
+from . import http_client, http_cache
+
+MAX_HTML_BYTES = int(os.getenv("AGENT_HTTP_TEXT_MAX_BYTES", str(http_client.MAX_RESPONSE_BYTES)))
+MAX_LINKS = int(os.getenv("AGENT_HTTP_TEXT_LINKS", "20"))
+CACHE_SIZE = int(os.getenv("AGENT_HTTP_TEXT_CACHE_SIZE", "64"))
+CACHE_TTL = float(os.getenv("AGENT_HTTP_TEXT_CACHE_TTL", "300"))
+# Share of a block's text inside links above which it is taken for navigation
+MAX_LINK_DENSITY = 0.5
+
+SKIPPED_TAGS = {"script", "style", "noscript", "template", "svg", "canvas", "iframe", "head", "nav", "footer", "aside",
+                "form", "button", "select"}
+BLOCK_TAGS = {"p", "div", "section", "article", "main", "header", "li", "ul", "ol", "table", "tr", "td", "th", "br",
+              "blockquote", "pre", "dd", "dt", "figcaption", "h1", "h2", "h3", "h4", "h5", "h6"}
+HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+CHARSET_PATTERN = re.compile(r'charset=["\']?([\w.:-]+)', re.IGNORECASE)
+WHITESPACE_PATTERN = re.compile(r'\s+')
+
+class TextExtractor(HTMLParser):
+    # Fed the page piece by piece, keeps the readable blocks until `max_chars` of text are collected
+    def __init__(self, base_url: str, max_chars: int, max_links: int = None):
+        super().__init__(convert_charrefs=True)
+        self.base_url = base_url
+        self.max_chars = max_chars
+        self.max_links = MAX_LINKS if max_links is None else max_links
+        self.title = ""
+        self.blocks = []
+        self.links = OrderedDict()
+        self.size = 0
+        self.full = False
+        self._skip = 0
+        self._in_title = False
+        self._heading = False
+        self._parts = []
+        self._link_chars = 0
+        self._link = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "body":
+            self._skip = 0  # A head that was never closed
+        if tag == "title":
+            self._in_title = True
+        elif tag in SKIPPED_TAGS:
+            self._skip += 1
+        elif self._skip:
+            return
+        elif tag == "a":
+            self._link = (dict(attrs).get("href"), [])
+        elif tag in BLOCK_TAGS:
+            self._flush()
+            self._heading = tag in HEADING_TAGS
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self._in_title = False
+        elif tag in SKIPPED_TAGS:
+            self._skip = max(0, self._skip - 1)
+        elif self._skip:
+            return
+        elif tag == "a" and self._link is not None:
+            self._add_link(*self._link)
+            self._link = None
+        elif tag in BLOCK_TAGS:
+            self._flush()
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+            return
+        if self._skip or self.full:
+            return
+        self._parts.append(data)
+        if self._link is not None:
+            self._link[1].append(data)
+            self._link_chars += len(data.strip())
+
+    def _add_link(self, href: str, parts: list):
+        if not href or len(self.links) >= self.max_links:
+            return
+        url = urljoin(self.base_url, href.strip())
+        text = WHITESPACE_PATTERN.sub(" ", "".join(parts)).strip()
+        if urlparse(url).scheme in ("http", "https") and text and url not in self.links:
+            self.links[url] = text
+
+    def _flush(self):
+        text = WHITESPACE_PATTERN.sub(" ", "".join(self._parts)).strip()
+        link_chars, self._parts, self._link_chars = self._link_chars, [], 0
+        if not text or self.full:
+            return
+        if not self._heading and link_chars > len(text) * MAX_LINK_DENSITY:
+            return
+        if self._heading:
+            text = f"# {text}"
+        self.blocks.append(text[:self.max_chars - self.size])
+        self.size += len(text) + 1
+        self.full = self.size >= self.max_chars
+
+    def close(self):
+        super().close()
+        self._flush()
+
+    def render(self) -> str:
+        lines = []
+        if self.title.strip():
+            lines.append(f"Title: {WHITESPACE_PATTERN.sub(' ', self.title).strip()}")
+        lines.extend(self.blocks)
+        if self.links:
+            lines.append("Links:")
+            lines.extend(f"- {text}: {url}" for url, text in self.links.items())
+        return "\n".join(lines)
+
+@dataclass(frozen=True)
+class PageText:
+    url: str
+    status: int
+    text: str
+    truncated: bool
+    is_html: bool
+
+def _charset(content_type: str) -> str:
+    match = CHARSET_PATTERN.search(content_type or "")
+    try:
+        return codecs.lookup(match.group(1)).name if match else "utf-8"
+    except LookupError:
+        return "utf-8"
+
+def extract_text(url: str, chunks, content_type: str, max_chars: int, max_bytes: int = None) -> tuple:
+    # Stops reading as soon as the budget is filled, the rest of the page is never downloaded
+    max_bytes = max_bytes or MAX_HTML_BYTES
+    decoder = codecs.getincrementaldecoder(_charset(content_type))(errors="replace")
+    extractor = None
+    plain = []
+    plain_size = 0
+    size = 0
+    truncated = False
+    for chunk in chunks:
+        size += len(chunk)
+        text = decoder.decode(chunk)
+        if extractor is None and text:
+            is_html = "html" in (content_type or "").lower() or text.lstrip()[:1] == "<"
+            extractor = TextExtractor(url, max_chars) if is_html else False
+        if extractor:
+            extractor.feed(text)
+            if extractor.full:
+                truncated = True
+                break
+        elif text:
+            plain.append(text)
+            plain_size += len(text)
+            if plain_size >= max_chars:
+                truncated = True
+                break
+        if size >= max_bytes:
+            truncated = True
+            break
+    if extractor:
+        extractor.close()
+        return extractor.render(), truncated, True
+    text = "".join(plain)
+    return text[:max_chars], truncated or len(text) > max_chars, False
+
+def _split(content: bytes):
+    for start in range(0, len(content), http_client.STREAM_CHUNK_SIZE):
+        yield content[start:start + http_client.STREAM_CHUNK_SIZE]
+
+_pages = OrderedDict()
+_pages_lock = threading.Lock()
+
+def _cached_page(key: tuple) -> PageText:
+    with _pages_lock:
+        entry = _pages.get(key)
+        if entry is None or time.monotonic() - entry[0] > CACHE_TTL:
+            return None
+        _pages.move_to_end(key)
+        return entry[1]
+
+def _cache_page(key: tuple, page: PageText):
+    with _pages_lock:
+        _pages[key] = (time.monotonic(), page)
+        _pages.move_to_end(key)
+        while len(_pages) > CACHE_SIZE:
+            _pages.popitem(last=False)
+
+def fetch_text(url: str, max_chars: int, timeout=None, deadline: float = None) -> PageText:
+    key = (url, max_chars)
+    page = _cached_page(key)
+    if page is not None:
+        return page
+    cache = http_cache.get_cache()
+    if cache is not None:
+        # The HTTP cache stores whole bodies, extraction then runs over the stored copy
+        response = cache.get(url, max_bytes=MAX_HTML_BYTES, timeout=timeout, deadline=deadline)
+        text, truncated, is_html = extract_text(url, _split(response.content), response.headers.get("Content-Type"), max_chars)
+        page = PageText(url, response.status_code, text, truncated or response.truncated, is_html)
+    else:
+        with http_client.get(url, stream=True, deadline=deadline, **http_cache.timeout_kwargs(timeout)) as response:
+            chunks = http_client.iter_chunks(response, deadline)
+            text, truncated, is_html = extract_text(url, chunks, response.headers.get("Content-Type"), max_chars)
+            page = PageText(url, response.status_code, text, truncated, is_html)
+    if page.status < 400:
+        _cache_page(key, page)
+    return page
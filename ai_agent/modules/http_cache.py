@@ -0,0 +1,176 @@
+import hashlib
+import os
+import threading
+import time
+from email.utils import parsedate_to_datetime
+import requests
+from ..cache import DiskCache
+from . import http_client
+
+DEFAULT_TTL = float(os.getenv("AGENT_HTTP_CACHE_DEFAULT_TTL", "0"))
+CACHEABLE_STATUSES = (200, 203)
+STORED_HEADERS = ("Cache-Control", "Expires", "ETag", "Last-Modified", "Content-Type")
+
+class CachedResponse:
+    def __init__(self, url: str, status_code: int, headers: dict, encoding: str, content: bytes,
+                 truncated: bool, from_cache: bool = False):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.encoding = encoding
+        self.content = content
+        self.truncated = truncated
+        self.from_cache = from_cache
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error for url: {self.url}")
+
+    def text(self) -> str:
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+def parse_cache_control(value: str) -> dict:
+    directives = {}
+    for part in (value or "").split(","):
+        name, _, argument = part.strip().partition("=")
+        if name:
+            directives[name.lower()] = argument.strip('"')
+    return directives
+
+def freshness_lifetime(headers: dict, default_ttl: float) -> float:
+    directives = parse_cache_control(headers.get("Cache-Control"))
+    if "no-cache" in directives:
+        return 0
+    for name in ("s-maxage", "max-age"):
+        if name in directives:
+            try:
+                return max(0, int(directives[name]))
+            except ValueError:
+                return 0
+    if headers.get("Expires"):
+        try:
+            expires = parsedate_to_datetime(headers["Expires"]).timestamp()
+            return max(0, expires - time.time())
+        except (TypeError, ValueError):
+            return 0
+    # No freshness information from the server, only validators are used
+    return default_ttl
+
+def is_storable(status_code: int, headers: dict) -> bool:
+    directives = parse_cache_control(headers.get("Cache-Control"))
+    return status_code in CACHEABLE_STATUSES and "no-store" not in directives and headers.get("Vary") != "*"
+
+def timeout_kwargs(timeout) -> dict:
+    # Without an explicit timeout the client's connect/read defaults apply
+    return {} if timeout is None else {"timeout": timeout}
+
+class HTTPCache:
+    def __init__(self, store: DiskCache, default_ttl: float = DEFAULT_TTL):
+        self.store = store
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def _key(self, url: str) -> str:
+        return hashlib.sha256(f"GET {url}".encode("utf-8")).hexdigest()
+
+    def get(self, url: str, headers: dict = None, max_bytes: int = None, timeout=None, deadline: float = None) -> CachedResponse:
+        max_bytes = max_bytes or http_client.MAX_RESPONSE_BYTES
+        key = self._key(url)
+        cached = self.store.get(key)
+        request_headers = dict(headers or {})
+
+        if cached is not None:
+            content, meta = cached
+            # A body cut at a smaller budget cannot serve a larger one
+            if meta["truncated"] and len(content) < max_bytes:
+                cached = None
+            elif time.time() < meta["fresh_until"]:
+                self._count("hits")
+                return self._from_entry(url, content, meta, max_bytes)
+            elif meta["headers"].get("ETag") or meta["headers"].get("Last-Modified"):
+                if meta["headers"].get("ETag"):
+                    request_headers["If-None-Match"] = meta["headers"]["ETag"]
+                if meta["headers"].get("Last-Modified"):
+                    request_headers["If-Modified-Since"] = meta["headers"]["Last-Modified"]
+            else:
+                cached = None
+
+        with http_client.get(url, headers=request_headers, stream=True, deadline=deadline,
+                             **timeout_kwargs(timeout)) as response:
+            response_headers = {name: response.headers[name] for name in STORED_HEADERS if name in response.headers}
+            if response.status_code == 304 and cached is not None:
+                content, meta = cached
+                response_headers.pop("Content-Type", None)
+                meta["headers"].update(response_headers)
+                meta["fresh_until"] = time.time() + freshness_lifetime(meta["headers"], self.default_ttl)
+                self.store.touch(key, meta)
+                self._count("revalidations")
+                return self._from_entry(url, content, meta, max_bytes)
+
+            content, truncated = http_client.read_bytes(response, max_bytes, deadline=deadline)
+            self._count("misses")
+            result = CachedResponse(url, response.status_code, response.headers, response.encoding,
+                                    content, truncated)
+
+        if is_storable(result.status_code, result.headers):
+            meta = {
+                "status_code": result.status_code,
+                "headers": response_headers,
+                "encoding": result.encoding,
+                "truncated": truncated,
+                "fresh_until": time.time() + freshness_lifetime(response_headers, self.default_ttl)
+            }
+            self.store.put(key, content, meta)
+        return result
+
+    def _from_entry(self, url: str, content: bytes, meta: dict, max_bytes: int) -> CachedResponse:
+        truncated = meta["truncated"] or len(content) > max_bytes
+        return CachedResponse(url, meta["status_code"], meta["headers"], meta["encoding"],
+                              content[:max_bytes], truncated, from_cache=True)
+
+    def stats(self) -> dict:
+        stats = self.store.stats()
+        return {
+            "hits": self.hits,
+            "revalidations": self.revalidations,
+            "misses": self.misses,
+            "entries": stats["entries"],
+            "bytes": stats["bytes"]
+        }
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        path = os.getenv("AGENT_HTTP_CACHE")
+        if not path:
+            return None
+        with _cache_lock:
+            if _cache is None:
+                max_mb = float(os.getenv("AGENT_HTTP_CACHE_MAX_MB", "100"))
+                _cache = HTTPCache(DiskCache(path, max_bytes=int(max_mb * 1024 * 1024) or None))
+    return _cache
+
+def set_cache(cache: HTTPCache):
+    global _cache
+    with _cache_lock:
+        _cache = cache
+
+def cached_get(url: str, headers: dict = None, max_bytes: int = None, timeout=None, deadline: float = None) -> CachedResponse:
+    cache = get_cache()
+    if cache is not None:
+        return cache.get(url, headers=headers, max_bytes=max_bytes, timeout=timeout, deadline=deadline)
+
+    with http_client.get(url, headers=headers, stream=True, deadline=deadline, **timeout_kwargs(timeout)) as response:
+        content, truncated = http_client.read_bytes(response, max_bytes, deadline=deadline)
+        return CachedResponse(url, response.status_code, response.headers, response.encoding,
+                              content, truncated)
@@ -0,0 +1,112 @@
+import os
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+CONNECT_TIMEOUT = float(os.getenv("AGENT_HTTP_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("AGENT_HTTP_READ_TIMEOUT", "30"))
+MAX_RETRIES = int(os.getenv("AGENT_HTTP_RETRIES", "3"))
+BACKOFF_FACTOR = float(os.getenv("AGENT_HTTP_BACKOFF", "0.5"))
+POOL_CONNECTIONS = int(os.getenv("AGENT_HTTP_POOL_CONNECTIONS", "10"))
+POOL_MAXSIZE = int(os.getenv("AGENT_HTTP_POOL_MAXSIZE", "10"))
+MAX_RESPONSE_BYTES = int(os.getenv("AGENT_HTTP_MAX_BYTES", str(1024 * 1024)))
+STREAM_CHUNK_SIZE = 8192
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_session = None
+_deadline_session = None
+_session_lock = threading.Lock()
+
+def create_session(max_retries: int = None, backoff_factor: float = None,
+                   pool_connections: int = None, pool_maxsize: int = None) -> requests.Session:
+    # Only idempotent methods are retried, a POST is never sent twice
+    retry = Retry(
+        total=MAX_RETRIES if max_retries is None else max_retries,
+        backoff_factor=BACKOFF_FACTOR if backoff_factor is None else backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(["GET", "HEAD", "OPTIONS"]),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    # One connection pool per host, connections are kept alive between steps
+    adapter = HTTPAdapter(
+        max_retries=retry,
+        pool_connections=pool_connections or POOL_CONNECTIONS,
+        pool_maxsize=pool_maxsize or POOL_MAXSIZE
+    )
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+def get_session() -> requests.Session:
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session()
+    return _session
+
+def get_deadline_session() -> requests.Session:
+    # Retries would run past a caller's deadline, requests with one are sent once
+    global _deadline_session
+    if _deadline_session is None:
+        with _session_lock:
+            if _deadline_session is None:
+                _deadline_session = create_session(max_retries=0)
+    return _deadline_session
+
+def remaining(deadline: float, url: str) -> float:
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise requests.Timeout(f"Deadline exceeded for {url}")
+    return left
+
+def set_session(session: requests.Session):
+    global _session
+    with _session_lock:
+        previous, _session = _session, session
+    if previous is not None and previous is not session:
+        previous.close()
+
+def request(method: str, url: str, deadline: float = None, **kwargs) -> requests.Response:
+    # A deadline is a time.monotonic() value bounding the whole request, including connection setup
+    if deadline is not None:
+        left = remaining(deadline, url)
+        kwargs["timeout"] = (min(CONNECT_TIMEOUT, left), left)
+        return get_deadline_session().request(method, url, **kwargs)
+    kwargs.setdefault("timeout", (CONNECT_TIMEOUT, READ_TIMEOUT))
+    return get_session().request(method, url, **kwargs)
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
+
+def iter_chunks(response: requests.Response, deadline: float = None):
+    # The read timeout applies to each read, a deadline also stops a body that keeps trickling in
+    for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+        if deadline is not None:
+            remaining(deadline, response.url)
+        yield chunk
+
+def read_bytes(response: requests.Response, max_bytes: int = None, skip: int = 0, deadline: float = None):
+    # Stream the body and stop as soon as the budget is used up
+    max_bytes = max_bytes or MAX_RESPONSE_BYTES
+    parts = []
+    size = 0
+    truncated = False
+    for chunk in iter_chunks(response, deadline):
+        if skip:
+            dropped = min(skip, len(chunk))
+            chunk = chunk[dropped:]
+            skip -= dropped
+        parts.append(chunk)
+        size += len(chunk)
+        if size >= max_bytes:
+            truncated = True
+            break
+    return b"".join(parts)[:max_bytes], truncated
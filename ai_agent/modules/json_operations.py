@@ -1,27 +1,262 @@
+import hashlib
+import itertools
 import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Union
+from ..blobs import blob_store
 from ..module import Module
+from ..workspace import workspace_path
 
-def parse_json(json_string: str) -> str:
+JSONData = Union[str, dict, list]
+
+HANDLE_PREFIX = "json:"
+FILE_HANDLE_PREFIX = HANDLE_PREFIX + "file:"
+BLOB_HANDLE_PREFIX = HANDLE_PREFIX + "blob:"
+DOCUMENT_CACHE_SIZE = int(os.getenv("AGENT_JSON_CACHE_SIZE", "32"))
+JSON_INDENT = int(os.getenv("AGENT_JSON_INDENT", "0")) or None
+PATH_TOKEN_PATTERN = re.compile(r'''\.?([^.\[\]]+)|\[\s*(-?\d+|\*|"[^"]*"|'[^']*')\s*\]''')
+
+# Parsed documents by handle or text digest, shared by every step of every goal in this process.
+# Handles name where the document can be read again, so an evicted entry is only parsed once more.
+_documents = OrderedDict()
+_documents_lock = threading.Lock()
+
+def dump_json(value) -> str:
+    return json.dumps(value, indent=JSON_INDENT)
+
+def _cache_document(handle: str, load):
+    with _documents_lock:
+        if handle in _documents:
+            _documents.move_to_end(handle)
+            return _documents[handle]
+    document = load()
+    with _documents_lock:
+        _documents[handle] = document
+        while len(_documents) > DOCUMENT_CACHE_SIZE:
+            _documents.popitem(last=False)
+    return document
+
+def _text_key(json_string: str) -> str:
+    return "text:" + hashlib.sha1(json_string.encode("utf-8")).hexdigest()
+
+def _file_state(full_path: str) -> str:
+    stat = os.stat(full_path)
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+def _file_handle(full_path: str) -> str:
+    return f"{FILE_HANDLE_PREFIX}{os.path.abspath(full_path)}@{_file_state(full_path)}"
+
+def _read_json_file(full_path: str):
+    with open(full_path, 'rb') as file:
+        return json.load(file)
+
+def _handle_file(handle: str) -> str:
+    # A file handle holds the file's state when it was loaded, it is checked on every use
+    full_path, _, state = handle[len(FILE_HANDLE_PREFIX):].rpartition("@")
+    if not os.path.exists(full_path):
+        raise KeyError(f"JSON handle '{handle}' refers to a file that no longer exists")
+    if _file_state(full_path) != state:
+        raise KeyError(f"JSON file '{full_path}' changed since it was loaded, load it again")
+    return full_path
+
+def _read_handle(handle: str):
+    # A blob handle holds the digest of the stored text
+    if handle.startswith(FILE_HANDLE_PREFIX):
+        return _read_json_file(_handle_file(handle))
+    if handle.startswith(BLOB_HANDLE_PREFIX):
+        path = blob_store().path(handle[len(BLOB_HANDLE_PREFIX):])
+        if os.path.exists(path):
+            return _read_json_file(path)
+    raise KeyError(f"Unknown or expired JSON handle '{handle}'")
+
+def _load(json_data: JSONData):
+    # Accepts parsed values, handles from load_json/load_json_file, or JSON text
+    if not isinstance(json_data, str):
+        return json_data
+    if json_data.startswith(HANDLE_PREFIX):
+        if json_data.startswith(FILE_HANDLE_PREFIX):
+            _handle_file(json_data)  # A cached document must not outlive a change to its file
+        return _cache_document(json_data, lambda: _read_handle(json_data))
+    return _cache_document(_text_key(json_data), lambda: json.loads(json_data))
+
+@lru_cache(maxsize=256)
+def compile_path(path: str) -> tuple:
+    # "items[0].name", "items[*].name", "data.*.id" or "$.a['b.c']" become ("key"|"index"|"wildcard", value) tokens
+    path = path.strip()
+    if path.startswith("$"):
+        path = path[1:]
+    tokens = []
+    position = 0
+    while position < len(path):
+        match = PATH_TOKEN_PATTERN.match(path, position)
+        if not match:
+            raise ValueError(f"Invalid JSON path '{path}' at position {position}")
+        key, bracket = match.groups()
+        if key is not None:
+            tokens.append(("wildcard", None) if key == "*" else ("key", key))
+        elif bracket == "*":
+            tokens.append(("wildcard", None))
+        elif bracket[0] in "\"'":
+            tokens.append(("key", bracket[1:-1]))
+        else:
+            tokens.append(("index", int(bracket)))
+        position = match.end()
+    return tuple(tokens)
+
+def _select(value, tokens) -> list:
+    matches = [value]
+    for kind, token in tokens:
+        selected = []
+        for match in matches:
+            if kind == "wildcard":
+                if isinstance(match, dict):
+                    selected.extend(match.values())
+                elif isinstance(match, list):
+                    selected.extend(match)
+            elif kind == "index":
+                if isinstance(match, list) and -len(match) <= token < len(match):
+                    selected.append(match[token])
+            elif isinstance(match, dict) and token in match:
+                selected.append(match[token])
+            elif isinstance(match, list) and token.lstrip("-").isdigit() and -len(match) <= int(token) < len(match):
+                selected.append(match[int(token)])
+        matches = selected
+    return matches
+
+def _render(value) -> str:
+    return dump_json(value) if isinstance(value, (dict, list)) else str(value)
+
+def parse_json(json_string: JSONData) -> str:
     try:
-        parsed_data = json.loads(json_string)
-        return json.dumps(parsed_data, indent=2)
+        return dump_json(_load(json_string))
     except json.JSONDecodeError as e:
         return f"Error parsing JSON: {str(e)}"
     except Exception as e:
         return f"Unexpected error while parsing JSON: {str(e)}"
 
-def get_json_value(json_string: str, key: str) -> str:
+def load_json(json_string: JSONData) -> str:
     try:
-        parsed_data = json.loads(json_string)
-        if key in parsed_data:
-            return str(parsed_data[key])
-        else:
+        document = _load(json_string)
+        if isinstance(json_string, str) and json_string.startswith(HANDLE_PREFIX):
+            return json_string
+        # Kept in the workspace's blob store, the handle stays valid after eviction and across a resume
+        text = json_string if isinstance(json_string, str) else dump_json(document)
+        path = blob_store().put(text.encode("utf-8"))
+        handle = BLOB_HANDLE_PREFIX + os.path.basename(path)
+        _cache_document(handle, lambda: document)
+        return handle
+    except json.JSONDecodeError as e:
+        return f"Error parsing JSON: {str(e)}"
+    except Exception as e:
+        return f"Unexpected error while loading JSON: {str(e)}"
+
+def load_json_file(file_path: str) -> str:
+    full_path = workspace_path(file_path)
+    try:
+        if not os.path.exists(full_path):
+            return f"Error: File '{full_path}' does not exist."
+        handle = _file_handle(full_path)
+        _cache_document(handle, lambda: _read_json_file(full_path))
+        return handle
+    except json.JSONDecodeError as e:
+        return f"Error parsing JSON file '{full_path}': {str(e)}"
+    except Exception as e:
+        return f"Error loading JSON file '{full_path}': {str(e)}"
+
+def get_json_value(json_string: JSONData, key: str) -> str:
+    try:
+        parsed_data = _load(json_string)
+        if isinstance(parsed_data, dict) and key in parsed_data:
+            return _render(parsed_data[key])
+        matches = _select(parsed_data, compile_path(key))
+        if not matches:
             return f"Key '{key}' not found in JSON data"
+        wildcard = any(kind == "wildcard" for kind, _ in compile_path(key))
+        return dump_json(matches) if wildcard else _render(matches[0])
     except json.JSONDecodeError as e:
         return f"Error parsing JSON: {str(e)}"
     except Exception as e:
         return f"Unexpected error while getting JSON value: {str(e)}"
 
+def query_json(json_string: JSONData, path: str) -> str:
+    try:
+        return dump_json(_select(_load(json_string), compile_path(path)))
+    except json.JSONDecodeError as e:
+        return f"Error parsing JSON: {str(e)}"
+    except Exception as e:
+        return f"Unexpected error while querying JSON: {str(e)}"
+
+def _stream_matches(full_path: str, tokens: tuple):
+    import ijson
+
+    # The leading object keys select a subtree, only that subtree or one array element at a time is held in memory.
+    # A key made of digits may index a list ("items.1"), so the prefix stops there.
+    prefix = []
+    for position, (kind, token) in enumerate(tokens):
+        if kind != "key" or token.lstrip("-").isdigit():
+            break
+        prefix.append(token)
+    else:
+        position = len(tokens)
+    prefix = ".".join(prefix)
+
+    with open(full_path, 'rb') as file:
+        if position == len(tokens):
+            yield from itertools.islice(ijson.items(file, prefix, use_float=True), 1)
+            return
+        kind, token = tokens[position]
+        rest = tokens[position + 1:]
+        elements = ijson.items(file, f"{prefix}.item" if prefix else "item", use_float=True)
+        if kind == "index" and token >= 0:
+            for element in itertools.islice(elements, token, token + 1):
+                yield from _select(element, rest)
+            return
+        if kind == "key" and token.isdigit():
+            # Streamed as a list index, an object with that key is found in the subtree below
+            found = False
+            for element in itertools.islice(elements, int(token), int(token) + 1):
+                found = True
+                yield from _select(element, rest)
+            if found:
+                return
+        if kind == "wildcard":
+            found = False
+            for element in elements:
+                found = True
+                yield from _select(element, rest)
+            if found:
+                return
+
+    # Negative indices, digit keys of objects and wildcards over objects need the whole subtree
+    with open(full_path, 'rb') as file:
+        for subtree in itertools.islice(ijson.items(file, prefix, use_float=True), 1):
+            yield from _select(subtree, tokens[position:])
+
+def query_json_file(file_path: str, path: str, max_results: str = "100") -> str:
+    full_path = workspace_path(file_path)
+    try:
+        if not os.path.exists(full_path):
+            return f"Error: File '{full_path}' does not exist."
+        tokens = compile_path(path)
+        limit = int(max_results)
+        try:
+            matches = list(itertools.islice(_stream_matches(full_path, tokens), limit))
+        except ImportError:
+            # Without ijson the file is parsed once and kept as a cached document
+            handle = load_json_file(file_path)
+            if not handle.startswith(HANDLE_PREFIX):
+                return handle
+            matches = _select(_load(handle), tokens)[:limit]
+        return dump_json(matches)
+    except ValueError as e:
+        return f"Error querying JSON file '{full_path}': {str(e)}"
+    except Exception as e:
+        return f"Unexpected error while querying JSON file '{full_path}': {str(e)}"
+
 def create_json(key_value_pairs: str) -> str:
     try:
         pairs = [pair.strip() for pair in key_value_pairs.split(',')]
@@ -29,7 +264,7 @@ def create_json(key_value_pairs: str) -> str:
         for pair in pairs:
             key, value = pair.split(':', 1)
             data[key.strip()] = value.strip()
-        return json.dumps(data, indent=2)
+        return dump_json(data)
     except Exception as e:
         return f"Error creating JSON: {str(e)}"
 
@@ -61,10 +296,15 @@ def to_json(input_string: str) -> str:
             return f"Error converting to JSON: {str(e)}"
 
     # Convert the object to a JSON string
-    return json.dumps(json_object, indent=2)
+    return dump_json(json_object)
 
 json_operations_module = Module("json_operations")
-json_operations_module.add_function("parse_json", parse_json)
-json_operations_module.add_function("get_json_value", get_json_value)
-json_operations_module.add_function("create_json", create_json)
-json_operations_module.add_function("to_json", to_json)
\ No newline at end of file
+json_operations_module.add_function("parse_json", parse_json, idempotent=True)
+json_operations_module.add_function("get_json_value", get_json_value, idempotent=True)
+json_operations_module.add_function("query_json", query_json, idempotent=True)
+# A handle is only as good as the blob or file behind it, so it is never reused from the step memo
+json_operations_module.add_function("load_json", load_json, idempotent=True, memoize=False)
+json_operations_module.add_function("load_json_file", load_json_file, idempotent=True, memoize=False)
+json_operations_module.add_function("query_json_file", query_json_file, idempotent=True)
+json_operations_module.add_function("create_json", create_json, idempotent=True)
+json_operations_module.add_function("to_json", to_json, idempotent=True)
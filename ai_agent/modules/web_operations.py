@@ -1,17 +1,94 @@
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Union
 import requests
 from urllib.parse import urlparse, urljoin
 from ..module import Module
+from . import http_client, http_cache, html_text
 
-def make_get_request(url: str) -> str:
+MAX_RESPONSE_CHARS = int(os.getenv("AGENT_HTTP_MAX_CHARS", "500"))
+FETCH_CONCURRENCY = int(os.getenv("AGENT_FETCH_CONCURRENCY", "8"))
+FETCH_PER_HOST = int(os.getenv("AGENT_FETCH_PER_HOST", "2"))
+FETCH_TIMEOUT = float(os.getenv("AGENT_FETCH_TIMEOUT", "10"))
+PAGE_TEXT_TOKENS = int(os.getenv("AGENT_HTTP_TEXT_TOKENS", "500"))
+# Pages are returned as readable text and links instead of raw HTML
+EXTRACT_TEXT = os.getenv("AGENT_HTTP_EXTRACT", "0") == "1"
+URL_PATTERN = re.compile(r'https?://[^\s<>"\'\])]+')
+
+# Shared by every fetch_many call, steps running side by side stay within the same limits
+_fetch_slots = threading.BoundedSemaphore(FETCH_CONCURRENCY)
+_host_slots = {}
+_host_slots_lock = threading.Lock()
+
+def make_get_request(url: str, max_chars: str = None) -> str:
     try:
         # Check if the URL has a scheme, if not, add 'https://'
         parsed_url = urlparse(url)
         if not parsed_url.scheme:
             url = urljoin('https://', url)
 
-        response = requests.get(url)
+        max_chars = int(max_chars) if max_chars else MAX_RESPONSE_CHARS
+        if EXTRACT_TEXT:
+            return _page_text_response(url, max_chars)
+        # Any encoding needs at most four bytes per character
+        max_bytes = min(max_chars * 4, http_client.MAX_RESPONSE_BYTES)
+        response = http_cache.cached_get(url, max_bytes=max_bytes)
         response.raise_for_status()
-        return f"GET request to {url} successful. Response:\n{response.text[:500]}..."
+        text = response.text()
+        suffix = "..." if response.truncated or len(text) > max_chars else ""
+        text = text[:max_chars]
+        return f"GET request to {url} successful. Response:\n{text}{suffix}"
+    except requests.RequestException as e:
+        return f"Error making GET request to {url}: {str(e)}"
+    except Exception as e:
+        return f"Unexpected error during GET request to {url}: {str(e)}"
+
+def _page_text_response(url: str, max_chars: int, timeout=None) -> str:
+    page = html_text.fetch_text(url, max_chars, timeout=timeout)
+    if page.status >= 400:
+        raise requests.HTTPError(f"{page.status} Error for url: {url}")
+    suffix = "..." if page.truncated else ""
+    return f"GET request to {url} successful. Response:\n{page.text}{suffix}"
+
+def get_page_text(url: str, max_tokens: str = None) -> str:
+    try:
+        if not urlparse(url).scheme:
+            url = f"https://{url}"
+        # About four characters per token
+        max_chars = (int(max_tokens) if max_tokens else PAGE_TEXT_TOKENS) * 4
+        return _page_text_response(url, max_chars)
+    except requests.RequestException as e:
+        return f"Error making GET request to {url}: {str(e)}"
+    except Exception as e:
+        return f"Unexpected error during GET request to {url}: {str(e)}"
+
+def get_response_window(url: str, offset: str, length: str) -> str:
+    try:
+        # Check if the URL has a scheme, if not, add 'https://'
+        parsed_url = urlparse(url)
+        if not parsed_url.scheme:
+            url = urljoin('https://', url)
+
+        offset = int(offset)
+        length = int(length)
+        if offset < 0 or length <= 0:
+            return f"Error: Invalid window offset={offset}, length={length}"
+
+        headers = {"Range": f"bytes={offset}-{offset + length - 1}", "Accept-Encoding": "identity"}
+        with http_client.get(url, headers=headers, stream=True) as response:
+            if response.status_code == 416:
+                return f"Error: Offset {offset} is beyond the end of {url}"
+            response.raise_for_status()
+            # Servers without range support send the whole body, skip to the window ourselves
+            skip = 0 if response.status_code == 206 else offset
+            content, _ = http_client.read_bytes(response, length, skip=skip)
+            text = content.decode(response.encoding or "utf-8", errors="replace")
+        return f"Bytes {offset}-{offset + len(content) - 1} of {url}:\n{text}"
     except requests.RequestException as e:
         return f"Error making GET request to {url}: {str(e)}"
     except Exception as e:
@@ -32,7 +109,7 @@ def make_post_request(url: str, data: str) -> str:
         except:
             return f"Error: Invalid data format. Expected a dictionary-like string, got: {data}"
 
-        response = requests.post(url, json=data_dict)
+        response = http_client.post(url, json=data_dict)
         response.raise_for_status()
         return f"POST request to {url} successful. Response:\n{response.text[:500]}..."
     except requests.RequestException as e:
@@ -40,6 +117,92 @@ def make_post_request(url: str, data: str) -> str:
     except Exception as e:
         return f"Unexpected error during POST request to {url}: {str(e)}"
 
+def extract_urls(urls: Union[str, list]) -> list:
+    # A list of URLs or of objects with a url/link field, a JSON list, or text such as a google_search result
+    if isinstance(urls, str) and urls.lstrip()[:1] == "[":
+        try:
+            urls = json.loads(urls)
+        except json.JSONDecodeError:
+            pass
+    if isinstance(urls, dict):
+        urls = [urls]
+    if isinstance(urls, str):
+        candidates = URL_PATTERN.findall(urls) or [word for word in re.split(r'[\s,]+', urls) if "." in word.strip(".")]
+    else:
+        candidates = []
+        for item in urls or []:
+            if isinstance(item, dict):
+                item = item.get("url") or item.get("link")
+            if item:
+                candidates.append(str(item))
+    # Each URL is fetched once, in the order given
+    return list(dict.fromkeys(candidate.strip() for candidate in candidates if candidate.strip()))
+
+def _host_slot(host: str) -> threading.BoundedSemaphore:
+    with _host_slots_lock:
+        if host not in _host_slots:
+            _host_slots[host] = threading.BoundedSemaphore(FETCH_PER_HOST)
+        return _host_slots[host]
+
+@contextmanager
+def _acquired(slot: threading.BoundedSemaphore, deadline: float, message: str):
+    if not slot.acquire(timeout=max(0.0, deadline - time.monotonic())):
+        raise requests.Timeout(message)
+    try:
+        yield
+    finally:
+        slot.release()
+
+def _fetch(url: str, max_chars: int, timeout: float) -> dict:
+    # `timeout` bounds the whole fetch, waiting for a free slot included
+    result = {"url": url, "ok": False, "status": None, "content": None, "truncated": False, "elapsed": 0.0, "error": None}
+    if not urlparse(url).scheme:
+        url = result["url"] = f"https://{url}"
+    host = urlparse(url).netloc
+    if not host:
+        result["error"] = f"Invalid URL: {url}"
+        return result
+    start = time.perf_counter()
+    deadline = time.monotonic() + timeout
+    try:
+        with _acquired(_host_slot(host), deadline, f"No free connection to {host} within {timeout:g}s"), \
+                _acquired(_fetch_slots, deadline, f"No free fetch slot within {timeout:g}s"):
+            if EXTRACT_TEXT:
+                page = html_text.fetch_text(url, max_chars, deadline=deadline)
+                status, text, truncated = page.status, page.text, page.truncated
+            else:
+                response = http_cache.cached_get(
+                    url, max_bytes=min(max_chars * 4, http_client.MAX_RESPONSE_BYTES), deadline=deadline
+                )
+                text = response.text()
+                status, text, truncated = response.status_code, text[:max_chars], response.truncated or len(text) > max_chars
+        result.update(ok=status < 400, status=status, content=text, truncated=truncated)
+        if status >= 400:
+            result["error"] = f"HTTP {status}"
+    except requests.RequestException as e:
+        result["error"] = f"Error making GET request to {url}: {str(e)}"
+    except Exception as e:
+        result["error"] = f"Unexpected error during GET request to {url}: {str(e)}"
+    result["elapsed"] = round(time.perf_counter() - start, 3)
+    return result
+
+def fetch_many(urls: Union[str, list], max_chars: str = None, timeout: str = None) -> str:
+    try:
+        url_list = extract_urls(urls)
+        if not url_list:
+            return f"Error: No URLs found in {str(urls)[:200]}"
+        max_chars = int(max_chars) if max_chars else MAX_RESPONSE_CHARS
+        timeout = float(timeout) if timeout else FETCH_TIMEOUT
+        # Failures are reported in their own entries, one slow or broken URL does not hold back the others
+        with ThreadPoolExecutor(max_workers=min(len(url_list), FETCH_CONCURRENCY)) as pool:
+            results = list(pool.map(lambda url: _fetch(url, max_chars, timeout), url_list))
+        return json.dumps(results)
+    except Exception as e:
+        return f"Unexpected error during fetch_many: {str(e)}"
+
 web_operations_module = Module("web_operations")
-web_operations_module.add_function("make_get_request", make_get_request)
-web_operations_module.add_function("make_post_request", make_post_request)
\ No newline at end of file
+web_operations_module.add_function("make_get_request", make_get_request, idempotent=True)
+web_operations_module.add_function("make_post_request", make_post_request)
+web_operations_module.add_function("get_response_window", get_response_window, idempotent=True)
+web_operations_module.add_function("fetch_many", fetch_many, idempotent=True)
+web_operations_module.add_function("get_page_text", get_page_text, idempotent=True)
\ No newline at end of file
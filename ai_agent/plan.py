@@ -0,0 +1,213 @@
+import inspect
+import json
+import re
+from dataclasses import dataclass
+from .results import StepResult
+
+STEP_NUMBER_PATTERN = re.compile(r'^\d+\.\s*')
+STEP_LINE_PATTERN = re.compile(r'^(\{|\w+\.\w+\s*(,|$))')
+STEP_REFERENCE_PATTERN = re.compile(r'^\[result from step (\d+)\]$', re.IGNORECASE)
+REFERENCE_KEY = "result_from_step"
+STEP_FORMAT = '{"module": "[Module name]", "function": "[Function name]", "args": ["[Argument 1]", {"result_from_step": [Step number]}]}'
+STEP_FORMAT_RULES = (
+    "Write every step as a single-line JSON object. Arguments keep their JSON types. "
+    "To pass the result of an earlier step, use {\"result_from_step\": N} as the argument, where N is that step's number. "
+    "Steps that only read (searches, GET requests, file reads, JSON queries) run at the same time unless one uses another's result; "
+    "a step that writes or changes something runs after every earlier step has finished, and later steps wait for it."
+)
+
+class PlanError(ValueError):
+    pass
+
+@dataclass(frozen=True)
+class StepRef:
+    step: int
+
+    def __str__(self):
+        return f"[result from step {self.step}]"
+
+@dataclass(frozen=True)
+class Step:
+    number: int
+    module: str
+    function: str
+    args: tuple = ()
+    depends_on: frozenset = frozenset()
+
+    @property
+    def name(self) -> str:
+        return f"{self.module}.{self.function}"
+
+    def to_dict(self) -> dict:
+        args = [{REFERENCE_KEY: arg.step} if isinstance(arg, StepRef) else arg for arg in self.args]
+        return {"module": self.module, "function": self.function, "args": args}
+
+    def __str__(self):
+        return json.dumps(self.to_dict())
+
+def decode_arg(value):
+    if isinstance(value, dict) and set(value) == {REFERENCE_KEY}:
+        return StepRef(int(value[REFERENCE_KEY]))
+    # Models drift back to the older "[result from step N]" form inside JSON steps
+    if isinstance(value, str):
+        match = STEP_REFERENCE_PATTERN.match(value.strip())
+        if match:
+            return StepRef(int(match.group(1)))
+    return value
+
+def decode_legacy_arg(value: str):
+    match = STEP_REFERENCE_PATTERN.match(value)
+    if match:
+        return StepRef(int(match.group(1)))
+    return value.strip('"')  # Remove quotes from arguments
+
+def parse_step_line(line: str):
+    line = STEP_NUMBER_PATTERN.sub('', line.strip())
+    if line.startswith('{'):
+        try:
+            data = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise PlanError(f"Invalid JSON step {line}: {str(e)}")
+        if not isinstance(data, dict) or "module" not in data or "function" not in data:
+            raise PlanError(f"Step must be an object with module, function and args: {line}")
+        args = data.get("args", [])
+        if not isinstance(args, list):
+            args = [args]
+        return data["module"], data["function"], [decode_arg(arg) for arg in args]
+
+    # Older free-text format: module.function, arg1, arg2
+    parts = line.split(',', 1)
+    module_parts = parts[0].strip().split('.')
+    if len(module_parts) != 2:
+        raise PlanError(f"Invalid module.function format: {parts[0].strip()}")
+    args = parts[1] if len(parts) > 1 else ""
+    return module_parts[0], module_parts[1], [decode_legacy_arg(arg.strip()) for arg in args.split(',') if arg.strip()]
+
+def validate_step(step: Step, modules: dict):
+    if step.module not in modules:
+        raise PlanError(f"Step {step.number}: module '{step.module}' not found")
+    module = modules[step.module]
+    if step.function not in module.list_functions():
+        raise PlanError(f"Step {step.number}: function '{step.function}' not found in module '{step.module}'")
+    for arg in step.args:
+        if isinstance(arg, StepRef) and not 1 <= arg.step < step.number:
+            raise PlanError(f"Step {step.number}: {arg} does not refer to an earlier step")
+    try:
+        # Lazily loaded modules are checked against their declared signatures without being imported
+        module.signature(step.function).bind(*step.args)
+    except TypeError as e:
+        raise PlanError(f"Step {step.number}: invalid arguments for {step.name}: {str(e)}")
+    except (ValueError, SyntaxError):
+        pass  # Builtins without a signature or malformed declarations cannot be checked
+
+def compile_step(line: str, modules: dict, number: int) -> Step:
+    # None for commentary around the steps
+    line = STEP_NUMBER_PATTERN.sub('', line.strip())
+    if not STEP_LINE_PATTERN.match(line):
+        return None
+    module_name, function_name, args = parse_step_line(line)
+    step = Step(
+        number=number,
+        module=module_name,
+        function=function_name,
+        args=tuple(args),
+        depends_on=frozenset(arg.step for arg in args if isinstance(arg, StepRef))
+    )
+    validate_step(step, modules)
+    return step
+
+def compile_steps(lines: list, modules: dict, start_number: int = 1) -> list:
+    steps = []
+    errors = []
+    for line in lines:
+        try:
+            step = compile_step(line, modules, start_number + len(steps))
+        except PlanError as e:
+            errors.append(str(e))
+            steps.append(None)
+            continue
+        if step is not None:
+            steps.append(step)
+    if errors:
+        raise PlanError("Invalid plan:\n" + "\n".join(errors))
+    return steps
+
+def section_lines(text: str, marker: str) -> list:
+    # Lines following the first line that starts with the marker, e.g. "Plan:"
+    lines = text.strip().split('\n')
+    for i, line in enumerate(lines):
+        if line.strip().lower().startswith(marker.lower()):
+            return lines[i + 1:]
+    return []
+
+def compile_plan(plan: str, modules: dict) -> list:
+    return compile_steps(section_lines(plan, "plan:"), modules)
+
+class PlanStream:
+    # Compiles a plan while the completion is still arriving, each step is returned once its line is complete.
+    # After an invalid step nothing more is returned, later steps may depend on it.
+    def __init__(self, modules: dict, marker: str = "plan:"):
+        self.modules = modules
+        self.marker = marker.lower()
+        self.lines = []
+        self.steps = []
+        self.errors = []
+        self._buffer = ""
+        self._in_plan = False
+
+    @property
+    def text(self) -> str:
+        # Complete lines only, a plan cut short still compiles
+        return "\n".join(self.lines)
+
+    def feed(self, chunk: str) -> list:
+        *lines, self._buffer = (self._buffer + chunk).split("\n")
+        return self._compile(lines)
+
+    def close(self) -> list:
+        rest, self._buffer = self._buffer, ""
+        return self._compile([rest]) if rest.strip() else []
+
+    def check(self):
+        if self.errors:
+            raise PlanError("Invalid plan:\n" + "\n".join(self.errors))
+
+    def _compile(self, lines: list) -> list:
+        compiled = []
+        for line in lines:
+            self.lines.append(line)
+            if not self._in_plan:
+                self._in_plan = line.strip().lower().startswith(self.marker)
+                continue
+            try:
+                step = compile_step(line, self.modules, len(self.steps) + 1)
+            except PlanError as e:
+                self.errors.append(str(e))
+                self.steps.append(None)
+                continue
+            if step is not None:
+                self.steps.append(step)
+                if not self.errors:
+                    compiled.append(step)
+        return compiled
+
+def coerce_args(function, args: list) -> list:
+    # Functions annotated to take strings get JSON or str() renderings of typed values,
+    # unannotated ones get step results as text
+    try:
+        parameters = list(inspect.signature(function).parameters.values())
+    except (TypeError, ValueError):
+        return [arg.text() if isinstance(arg, StepResult) else arg for arg in args]
+    coerced = []
+    for i, arg in enumerate(args):
+        parameter = parameters[min(i, len(parameters) - 1)] if parameters else None
+        annotation = parameter.annotation if parameter is not None else inspect.Parameter.empty
+        if isinstance(arg, StepResult):
+            arg = arg.text() if annotation in (str, inspect.Parameter.empty) else arg.value
+        elif annotation is str and arg is not None and not isinstance(arg, str):
+            arg = json.dumps(arg) if isinstance(arg, (dict, list)) else str(arg)
+        coerced.append(arg)
+    return coerced
+
+def format_module_signatures(module) -> str:
+    return ", ".join(module.describe_function(name) for name in module.list_functions())
@@ -0,0 +1,134 @@
+import hashlib
+import json
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+
+WORD_PATTERN = re.compile(r"\w+")
+NUM_PERMUTATIONS = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+MERSENNE_PRIME = (1 << 61) - 1
+# Fixed seed, signatures must stay comparable across processes and runs
+_random = random.Random(20240601)
+PERMUTATIONS = [
+    (_random.randrange(1, MERSENNE_PRIME), _random.randrange(0, MERSENNE_PRIME)) for _ in range(NUM_PERMUTATIONS)
+]
+
+def normalize_goal(goal: str) -> str:
+    return " ".join(WORD_PATTERN.findall(goal.lower()))
+
+def shingles(goal: str) -> set:
+    # Words and word pairs, so both vocabulary and word order count
+    words = normalize_goal(goal).split()
+    return set(words) | {f"{first} {second}" for first, second in zip(words, words[1:])}
+
+def minhash(shingle_set: set) -> list:
+    hashes = [int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+              for shingle in shingle_set]
+    if not hashes:
+        return [MERSENNE_PRIME] * NUM_PERMUTATIONS
+    return [min((a * value + b) % MERSENNE_PRIME for value in hashes) for a, b in PERMUTATIONS]
+
+def band_keys(signature: list) -> list:
+    return [
+        f"{band}:" + hashlib.blake2b(
+            json.dumps(signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]).encode("utf-8"), digest_size=8
+        ).hexdigest()
+        for band in range(BANDS)
+    ]
+
+def jaccard(first: set, second: set) -> float:
+    if not first and not second:
+        return 1.0
+    return len(first & second) / len(first | second)
+
+@dataclass(frozen=True)
+class PlanMatch:
+    goal: str
+    plan: str
+    similarity: float
+    uses: int
+
+class PlanCache:
+    def __init__(self, path: str, reuse_threshold: float = None, hint_threshold: float = None):
+        self.path = path
+        # A stored plan runs with its literal arguments, so by default only the same goal reuses it as is.
+        # "news about AI" and "news about Rust" are 0.9 similar, the stored plan only serves as a hint.
+        self.reuse_threshold = reuse_threshold or float(os.getenv("AGENT_PLAN_REUSE_THRESHOLD", "1.0"))
+        self.hint_threshold = hint_threshold or float(os.getenv("AGENT_PLAN_HINT_THRESHOLD", "0.5"))
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # Batch workers in other processes write to the same file
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS plans ("
+            "goal_key TEXT PRIMARY KEY, goal TEXT, plan TEXT, shingles TEXT, uses INTEGER, created REAL, used REAL)"
+        )
+        self._connection.execute("CREATE TABLE IF NOT EXISTS bands (band_key TEXT, goal_key TEXT)")
+        self._connection.execute("CREATE INDEX IF NOT EXISTS bands_key ON bands (band_key)")
+
+    def add(self, goal: str, plan: str):
+        goal_key = normalize_goal(goal)
+        goal_shingles = shingles(goal)
+        now = time.time()
+        with self._lock:
+            self._connection.execute("BEGIN")
+            try:
+                self._connection.execute("DELETE FROM bands WHERE goal_key = ?", (goal_key,))
+                self._connection.execute(
+                    "INSERT INTO plans (goal_key, goal, plan, shingles, uses, created, used) VALUES (?, ?, ?, ?, 0, ?, ?) "
+                    "ON CONFLICT (goal_key) DO UPDATE SET goal = excluded.goal, plan = excluded.plan, "
+                    "shingles = excluded.shingles, created = excluded.created",
+                    (goal_key, goal, plan, json.dumps(sorted(goal_shingles)), now, now)
+                )
+                self._connection.executemany(
+                    "INSERT INTO bands (band_key, goal_key) VALUES (?, ?)",
+                    [(key, goal_key) for key in band_keys(minhash(goal_shingles))]
+                )
+                self._connection.execute("COMMIT")
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+
+    def lookup(self, goal: str) -> PlanMatch:
+        # Candidates share at least one MinHash band, they are ranked by exact Jaccard similarity
+        goal_shingles = shingles(goal)
+        keys = band_keys(minhash(goal_shingles))
+        with self._lock:
+            rows = self._connection.execute(
+                "SELECT goal, plan, shingles, uses FROM plans WHERE goal_key IN "
+                f"(SELECT goal_key FROM bands WHERE band_key IN ({', '.join('?' * len(keys))}))",
+                keys
+            ).fetchall()
+        best = None
+        for stored_goal, plan, stored_shingles, uses in rows:
+            similarity = jaccard(goal_shingles, set(json.loads(stored_shingles)))
+            if similarity >= self.hint_threshold and (best is None or similarity > best.similarity):
+                best = PlanMatch(stored_goal, plan, similarity, uses)
+        return best
+
+    def record_use(self, match: PlanMatch):
+        with self._lock:
+            self._connection.execute(
+                "UPDATE plans SET uses = uses + 1, used = ? WHERE goal_key = ?", (time.time(), normalize_goal(match.goal))
+            )
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM plans").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+def plan_cache_from_env():
+    path = os.getenv("AGENT_PLAN_CACHE")
+    return PlanCache(path) if path else None
@@ -0,0 +1,117 @@
+import base64
+import json
+from dataclasses import asdict, dataclass
+
+RECORD_TYPES = {"str": str, "dict": dict, "list": list, "bytes": bytes, "int": int, "float": float, "bool": bool}
+
+@dataclass(frozen=True)
+class Blob:
+    # A result kept in a file instead of memory, `preview` stands in for it in prompts and logs
+    path: str
+    kind: str
+    size: int
+    preview: str
+
+    def load(self):
+        with open(self.path, "rb") as file:
+            data = file.read()
+        if self.kind == "bytes":
+            return data
+        text = data.decode("utf-8")
+        return json.loads(text) if self.kind == "json" else text
+
+class StepResult:
+    __slots__ = ("_value", "source", "original_type", "blob", "_text", "_json")
+
+    def __init__(self, value, source: str = None, original_type: type = None, blob: Blob = None):
+        self._value = value
+        self.source = source
+        self.original_type = original_type or type(value)
+        self.blob = blob
+        # Renderings are built on first use and kept for later prompts and arguments
+        self._text = None
+        self._json = None
+
+    @property
+    def value(self):
+        # A spilled value is read back for every use rather than held on to
+        return self.blob.load() if self.blob is not None else self._value
+
+    @classmethod
+    def from_value(cls, value, source: str = None) -> "StepResult":
+        if isinstance(value, StepResult):
+            return value
+        original_type = type(value)
+        # Only strings that look like JSON are parsed, plain text is kept as it is
+        if isinstance(value, str) and value.lstrip()[:1] in ("{", "["):
+            try:
+                value = json.loads(value)
+            except json.JSONDecodeError:
+                pass
+        return cls(value, source, original_type)
+
+    @property
+    def kind(self) -> str:
+        if self.blob is not None:
+            return self.blob.kind
+        if isinstance(self.value, (dict, list)):
+            return "json"
+        if isinstance(self.value, bytes):
+            return "bytes"
+        if isinstance(self.value, str):
+            return "text"
+        return "object"
+
+    def text(self) -> str:
+        if self.blob is not None:
+            return self._render_text(self.value)
+        if self._text is None:
+            self._text = self._render_text(self.value)
+        return self._text
+
+    def json(self) -> str:
+        if self.blob is not None:
+            return self._render_json(self.value)
+        if self._json is None:
+            self._json = self._render_json(self.value)
+        return self._json
+
+    def _render_text(self, value) -> str:
+        if isinstance(value, str):
+            return value
+        if isinstance(value, bytes):
+            return value.decode("utf-8", errors="replace")
+        if isinstance(value, (dict, list)):
+            return self._render_json(value)
+        return str(value)
+
+    def _render_json(self, value) -> str:
+        value = value.decode("utf-8", errors="replace") if isinstance(value, bytes) else value
+        return json.dumps(value, indent=2, default=str)
+
+    def to_record(self) -> dict:
+        if self.blob is not None:
+            return {"kind": self.kind, "blob": asdict(self.blob), "source": self.source, "type": self.original_type.__name__}
+        if isinstance(self.value, bytes):
+            value = {"base64": base64.b64encode(self.value).decode("ascii")}
+        elif isinstance(self.value, (str, dict, list, int, float, bool)) or self.value is None:
+            value = self.value
+        else:
+            value = self.text()
+        return {"kind": self.kind, "value": value, "source": self.source, "type": self.original_type.__name__}
+
+    @classmethod
+    def from_record(cls, record: dict) -> "StepResult":
+        if "blob" in record:
+            return cls(None, record.get("source"), RECORD_TYPES.get(record.get("type"), str), blob=Blob(**record["blob"]))
+        value = record["value"]
+        if record["kind"] == "bytes":
+            value = base64.b64decode(value["base64"])
+        return cls(value, record.get("source"), RECORD_TYPES.get(record.get("type"), type(value)))
+
+    def __str__(self):
+        # Prompts and logs show a spilled result's preview, functions taking it get the whole value
+        return self.blob.preview if self.blob is not None else self.text()
+
+    def __repr__(self):
+        return f"StepResult(kind={self.kind!r}, source={self.source!r}, spilled={self.blob is not None})"
@@ -0,0 +1,161 @@
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+import openai
+
+RETRYABLE_ERRORS = (
+    openai.error.RateLimitError,
+    openai.error.APIConnectionError,
+    openai.error.Timeout,
+    openai.error.ServiceUnavailableError,
+    openai.error.TryAgain
+)
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, RETRYABLE_ERRORS):
+        return True
+    # Other API errors are only transient when the server failed
+    return isinstance(error, openai.error.APIError) and (error.http_status or 0) >= 500
+
+def retry_after(error: Exception) -> float:
+    headers = getattr(error, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after") or headers.get("Retry-After") or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+def estimate_tokens(messages: list, params: dict) -> int:
+    # Roughly four characters per token, plus the completion the request may produce
+    prompt = sum(len(message.get("content") or "") for message in messages) // 4
+    completion = params.get("max_tokens") or int(os.getenv("AGENT_LLM_COMPLETION_ESTIMATE", "256"))
+    return prompt + completion
+
+class TokenBucket:
+    # Refills continuously at `per_minute`; a reservation debits at once and may leave the level
+    # negative, the caller waits until the debt is repaid, so reservations are served in order
+    def __init__(self, per_minute: float, capacity: float = None):
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float) -> float:
+        with self._lock:
+            self._refill()
+            self.level -= min(amount, self.capacity)
+            return max(0.0, -self.level / self.rate)
+
+    def adjust(self, amount: float):
+        # Positive amounts debit, negative ones refund an overestimate
+        with self._lock:
+            self._refill()
+            self.level = min(self.capacity, self.level - amount)
+
+class RequestScheduler:
+    def __init__(self, requests_per_minute: float = 0, tokens_per_minute: float = 0, max_retries: int = 5,
+                 retry_base: float = 1.0, retry_max: float = 60.0):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.retries = 0
+        self.coalesced = 0
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        # Shared in-flight requests are futures of the loop that started them
+        self._inflight = weakref.WeakKeyDictionary()
+
+    def _wait_for_capacity(self, tokens: int) -> float:
+        wait = self._paused_until - time.monotonic()
+        if self.requests is not None:
+            wait = max(wait, self.requests.reserve(1))
+        if self.tokens is not None:
+            wait = max(wait, self.tokens.reserve(tokens))
+        return max(0.0, wait)
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        # Full jitter keeps clients that failed together from retrying together
+        delay = max(retry_after(error), random.uniform(0, min(self.retry_max, self.retry_base * 2 ** attempt)))
+        if isinstance(error, openai.error.RateLimitError):
+            # The limit is shared by every caller, so all of them hold off
+            with self._lock:
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        return delay
+
+    async def _run(self, call, tokens: int, stats: dict):
+        attempt = 0
+        while True:
+            wait = self._wait_for_capacity(tokens)
+            if wait:
+                stats["rate_wait"] += wait
+                await asyncio.sleep(wait)
+            try:
+                response = await call()
+            except Exception as e:
+                if self.tokens is not None:
+                    self.tokens.adjust(-tokens)
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                delay = self._backoff(attempt, e)
+                attempt += 1
+                stats["retries"] = attempt
+                with self._lock:
+                    self.retries += 1
+                await asyncio.sleep(delay)
+                continue
+            usage = response.get("usage") if hasattr(response, "get") else None
+            if self.tokens is not None and usage and usage.get("total_tokens") is not None:
+                self.tokens.adjust(usage["total_tokens"] - tokens)
+            return response
+
+    async def submit(self, call, tokens: int = 0, key: str = None, stats: dict = None):
+        # Identical requests already in flight share one call and its response
+        stats = stats if stats is not None else {}
+        stats.setdefault("rate_wait", 0.0)
+        stats.setdefault("retries", 0)
+        if key is None:
+            return await self._run(call, tokens, stats)
+        loop = asyncio.get_running_loop()
+        inflight = self._inflight.setdefault(loop, {})
+        task = inflight.get(key)
+        if task is not None:
+            stats["coalesced"] = True
+            with self._lock:
+                self.coalesced += 1
+            return await asyncio.shield(task)
+        task = loop.create_task(self._run(call, tokens, stats))
+        inflight[key] = task
+        task.add_done_callback(lambda done: inflight.pop(key, None) if inflight.get(key) is done else None)
+        return await asyncio.shield(task)
+
+def scheduler_from_env() -> RequestScheduler:
+    # Batch workers each take an equal share of the per-key limits
+    shares = max(1, int(os.getenv("AGENT_LLM_RATE_SHARES", "1")))
+    return RequestScheduler(
+        requests_per_minute=float(os.getenv("AGENT_LLM_RPM", "0")) / shares,
+        tokens_per_minute=float(os.getenv("AGENT_LLM_TPM", "0")) / shares,
+        max_retries=int(os.getenv("AGENT_LLM_MAX_RETRIES", "5")),
+        retry_base=float(os.getenv("AGENT_LLM_RETRY_BASE", "1.0")),
+        retry_max=float(os.getenv("AGENT_LLM_RETRY_MAX", "60"))
+    )
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler() -> RequestScheduler:
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = scheduler_from_env()
+    return _scheduler
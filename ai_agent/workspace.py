@@ -0,0 +1,20 @@
+import os
+from contextvars import ContextVar
+
+# A context variable keeps concurrent goals apart, asyncio tasks and to_thread calls inherit it
+_workspace_dir = ContextVar("workspace_dir", default=os.getenv("AGENT_WORKSPACE_DIR", "workspace"))
+
+def get_workspace_dir() -> str:
+    return _workspace_dir.get()
+
+def set_workspace_dir(path: str):
+    _workspace_dir.set(path)
+
+def ensure_workspace_exists():
+    os.makedirs(get_workspace_dir(), exist_ok=True)
+
+def sanitize_filename(filename):
+    return os.path.normpath(filename).lstrip(os.sep)
+
+def workspace_path(filename: str) -> str:
+    return os.path.join(get_workspace_dir(), sanitize_filename(filename))
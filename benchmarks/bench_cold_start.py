@@ -0,0 +1,62 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Each scenario runs in a fresh interpreter, the way a short-lived worker process starts
+SCENARIOS = {
+    "python": "pass",
+    "import ai_agent": "import ai_agent",
+    "agent, lazy modules": """
+from ai_agent import AIAgent
+from ai_agent.modules import all_modules, google_search_module
+agent = AIAgent()
+for module in all_modules + [google_search_module]:
+    agent.add_module(module)
+""",
+    "agent, eager modules": """
+from ai_agent import AIAgent
+from ai_agent.modules.file_operations import file_operations_module
+from ai_agent.modules.web_operations import web_operations_module
+from ai_agent.modules.json_operations import json_operations_module
+from ai_agent.modules.google_search_operation import google_search_module
+agent = AIAgent()
+for module in (file_operations_module, web_operations_module, json_operations_module, google_search_module):
+    agent.add_module(module)
+""",
+    "lazy agent, one json call": """
+from ai_agent import AIAgent
+from ai_agent.modules import all_modules, google_search_module
+agent = AIAgent()
+for module in all_modules + [google_search_module]:
+    agent.add_module(module)
+agent.execute_module("json_operations", "get_json_value", '{"a": 1}', "a")
+""",
+    "commander": "from ai_agent.commander import Commander",
+}
+
+def measure(code: str, runs: int) -> list:
+    timings = []
+    env = dict(os.environ, PYTHONPATH=ROOT_DIR + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True, env=env, cwd=ROOT_DIR)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Measure interpreter start-up plus import time of the agent in fresh processes")
+    arg_parser.add_argument("--runs", type=int, default=10)
+    options = arg_parser.parse_args()
+
+    print(f"{'scenario':<28} {'median ms':>10} {'min ms':>8}")
+    for name, code in SCENARIOS.items():
+        timings = measure(code, options.runs)
+        print(f"{name:<28} {statistics.median(timings) * 1000:>10.1f} {min(timings) * 1000:>8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import resource
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_servers import FixtureHTTPServer, MockChatServer
+
+def scripted_plan(base_url: str, pages: int) -> str:
+    # Independent page fetches and a JSON query run concurrently, then the query result is written
+    # to the workspace and read back, the write waiting for every earlier step and the read for the write
+    steps = [{"module": "web_operations", "function": "make_get_request", "args": [f"{base_url}/articles/{i}", "2000"]}
+             for i in range(1, pages + 1)]
+    steps.append({"module": "web_operations", "function": "make_get_request", "args": [f"{base_url}/data.json"]})
+    steps.append({"module": "json_operations", "function": "query_json",
+                  "args": [{"items": [{"id": i, "title": f"Item {i}"} for i in range(50)]}, "items[*].title"]})
+    steps.append({"module": "file_operations", "function": "write_file",
+                  "args": ["summary.txt", {"result_from_step": pages + 2}]})
+    steps.append({"module": "file_operations", "function": "read_file", "args": ["summary.txt"]})
+    return "\n".join(json.dumps(step) for step in steps)
+
+async def run_goals(goals: list, options, workspace_root: str) -> list:
+    from ai_agent import AIAgent, ChatClient, Commander
+    from ai_agent.approval import PolicyApproval
+    from ai_agent.memory import ConversationMemory
+    from ai_agent.modules import all_modules
+
+    llm = ChatClient(cache_mode="off")
+    semaphore = asyncio.Semaphore(options.concurrency)
+
+    async def run_goal(number: int, goal: str) -> float:
+        async with semaphore:
+            agent = AIAgent()
+            for module in all_modules:
+                agent.add_module(module)
+            commander = Commander(
+                agent,
+                llm=llm,
+                approval=PolicyApproval(),
+                workspace_dir=os.path.join(workspace_root, f"goal-{number}"),
+                step_evaluation=options.step_evaluation,
+                memory=ConversationMemory(),
+                max_iterations=options.iterations + 1,
+                stream_plan=options.stream_plan
+            )
+            start = time.perf_counter()
+            await commander.aprocess_goal(goal)
+            return time.perf_counter() - start
+
+    return await asyncio.gather(*(run_goal(number, goal) for number, goal in enumerate(goals)))
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Run Commander end to end against local mock model and HTTP servers")
+    arg_parser.add_argument("--goals", type=int, default=10)
+    arg_parser.add_argument("--concurrency", type=int, default=4, help="Goals processed at the same time")
+    arg_parser.add_argument("--iterations", type=int, default=2, help="Iterations until the mock judges a goal achieved")
+    arg_parser.add_argument("--pages", type=int, default=3, help="Pages fetched by the scripted plan")
+    arg_parser.add_argument("--page-size", type=int, default=20000)
+    arg_parser.add_argument("--llm-latency", type=float, default=0.05, help="Seconds per mock completion")
+    arg_parser.add_argument("--http-latency", type=float, default=0.02, help="Seconds per fixture page")
+    arg_parser.add_argument("--step-evaluation", default="every", choices=["every", "batch", "anomaly"])
+    arg_parser.add_argument("--stream-plan", action="store_true", help="Start steps while the plan is streamed")
+    arg_parser.add_argument("--reasoning-lines", type=int, default=1, help="Reasoning lines before each scripted plan")
+    arg_parser.add_argument("--extract-text", action="store_true", help="Return readable page text instead of raw HTML")
+    arg_parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    options = arg_parser.parse_args()
+
+    fixtures = FixtureHTTPServer(page_size=options.page_size, latency=options.http_latency).start()
+    chat = MockChatServer(
+        scripted_plan(fixtures.url, options.pages), options.iterations, options.llm_latency, options.reasoning_lines
+    ).start()
+
+    # Nothing may leave the machine or be served from earlier runs
+    os.environ["OPENAI_API_KEY"] = "offline-benchmark"
+    for name in ("AGENT_LLM_CACHE", "AGENT_HTTP_CACHE", "AGENT_PLAN_CACHE", "AGENT_CHECKPOINT"):
+        os.environ.pop(name, None)
+    os.environ["AGENT_STEP_MEMO"] = "0"
+    os.environ["AGENT_HTTP_EXTRACT"] = "1" if options.extract_text else "0"
+    import openai
+    openai.api_base = f"{chat.url}/v1"
+    from ai_agent.instrumentation import get_instrumentation
+
+    events = []
+    get_instrumentation().add_hook(events.append)
+    goals = [f"Collect the benchmark articles and save a summary, run {number}" for number in range(options.goals)]
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as workspace_root, open(os.devnull, "w") as devnull, \
+            contextlib.redirect_stdout(devnull):
+        goal_latencies = asyncio.run(run_goals(goals, options, workspace_root))
+    elapsed = time.perf_counter() - start
+    _, peak_traced = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    chat.stop()
+    fixtures.stop()
+
+    iterations = [event["duration"] for event in events if event["kind"] == "iteration"]
+    first_steps = [event["first_step"] for event in events if event["kind"] == "iteration" and "first_step" in event]
+    steps = [event for event in events if event["kind"] == "step"]
+    llm_calls = [event for event in events if event["kind"] == "llm"]
+    report = {
+        "goals": len(goals),
+        "elapsed": elapsed,
+        "goal_latency_p50": percentile(goal_latencies, 0.5),
+        "goal_latency_p95": percentile(goal_latencies, 0.95),
+        "iterations": len(iterations),
+        "iteration_latency_mean": statistics.mean(iterations) if iterations else 0.0,
+        "iteration_latency_p95": percentile(iterations, 0.95),
+        "time_to_first_step_mean": statistics.mean(first_steps) if first_steps else 0.0,
+        "steps": len(steps),
+        "steps_per_second": len(steps) / elapsed if elapsed else 0.0,
+        "llm_calls_per_goal": len(llm_calls) / len(goals) if goals else 0.0,
+        "server_llm_calls": chat.calls,
+        "peak_traced_mb": peak_traced / 1024 / 1024,
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    }
+
+    if options.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"Goals: {report['goals']} in {report['elapsed']:.2f}s "
+          f"(p50 {report['goal_latency_p50']:.2f}s, p95 {report['goal_latency_p95']:.2f}s per goal)")
+    print(f"Iterations: {report['iterations']} "
+          f"(mean {report['iteration_latency_mean'] * 1000:.1f} ms, p95 {report['iteration_latency_p95'] * 1000:.1f} ms, "
+          f"first step after {report['time_to_first_step_mean'] * 1000:.1f} ms)")
+    print(f"Steps: {report['steps']} ({report['steps_per_second']:.1f} steps/s)")
+    print(f"Model calls per goal: {report['llm_calls_per_goal']:.1f}")
+    print(f"Peak memory: {report['peak_traced_mb']:.1f} MB traced, {report['max_rss_mb']:.1f} MB max RSS")
+
+if __name__ == "__main__":
+    main()
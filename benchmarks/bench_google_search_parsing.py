@@ -0,0 +1,52 @@
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai_agent.modules.google_search_operation import available_extractors, extract_results
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+def load_pages():
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, "google_search_*.html"))):
+        with open(path, encoding="utf-8") as file:
+            pages[os.path.basename(path)] = file.read()
+    return pages
+
+def benchmark(parser: str, pages: dict, iterations: int, num_results: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        for html in pages.values():
+            extract_results(html, num_results, parser=parser)
+    return iterations * len(pages) / (time.perf_counter() - start)
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Measure google_search result extraction speed per HTML parser backend")
+    arg_parser.add_argument("--iterations", type=int, default=20)
+    arg_parser.add_argument("--num-results", type=int, default=10)
+    options = arg_parser.parse_args()
+
+    pages = load_pages()
+    parsers = available_extractors()
+    print(f"Fixture pages: {', '.join(pages)} ({sum(len(html) for html in pages.values()) // 1024} KiB total)")
+
+    # Every backend has to agree with the full-page parse before its speed means anything
+    for name, html in pages.items():
+        expected = extract_results(html, options.num_results, parser="full")
+        for parser in parsers:
+            if extract_results(html, options.num_results, parser=parser) != expected:
+                print(f"Backend '{parser}' returned different results for {name}")
+                sys.exit(1)
+
+    baseline = None
+    for parser in reversed(parsers):
+        pages_per_second = benchmark(parser, pages, options.iterations, options.num_results)
+        baseline = baseline or pages_per_second
+        print(f"{parser:>12}: {pages_per_second:8.1f} pages/sec ({pages_per_second / baseline:.1f}x full parse)")
+
+if __name__ == "__main__":
+    main()
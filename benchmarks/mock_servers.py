@@ -0,0 +1,162 @@
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+GOAL_PATTERN = re.compile(r'^\s*Goal: (.*)$', re.MULTILINE)
+
+# Picked by the system prompt of each Commander request
+PLAN_PROMPT = "creates detailed, step-by-step plans"
+STEP_REVIEW_PROMPT = "suggests plan modifications"
+GOAL_EVALUATION_PROMPT = "determines if the goal has been achieved"
+ERROR_PROMPT = "helps solve errors"
+SUMMARY_PROMPT = "running summary"
+
+class _QuietHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: dict = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+class _QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        pass  # Clients dropping pooled keep-alive connections at exit are expected
+
+class _Server:
+    handler = None
+
+    def __init__(self):
+        self.server = _QuietServer(("127.0.0.1", 0), self.handler)
+        self.server.owner = self
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+class _ChatHandler(_QuietHandler):
+    def do_POST(self):
+        owner = self.server.owner
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        messages = request["messages"]
+        content = owner.respond(messages[0]["content"], messages[-1]["content"])
+        if request.get("stream"):
+            return self._stream(request, content, owner.latency)
+        time.sleep(owner.latency)
+        prompt_tokens = sum(len(message["content"]) for message in messages) // 4
+        body = json.dumps({
+            "id": "chatcmpl-mock",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(content) // 4,
+                "total_tokens": prompt_tokens + len(content) // 4
+            }
+        }).encode("utf-8")
+        self._send(200, body, "application/json")
+
+    def _stream(self, request: dict, content: str, latency: float):
+        # Server-sent events, one line of the reply per chunk, spread over the latency of a whole reply
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        lines = content.splitlines(keepends=True)
+        for line in lines:
+            time.sleep(latency / len(lines))
+            chunk = {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": request.get("model"),
+                "choices": [{"index": 0, "delta": {"content": line}, "finish_reason": None}]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+
+class MockChatServer(_Server):
+    # OpenAI-compatible chat completions endpoint returning scripted plans and evaluations.
+    # Each goal is judged achieved on its `iterations`-th evaluation.
+    handler = _ChatHandler
+
+    def __init__(self, plan: str, iterations: int = 1, latency: float = 0.0, reasoning_lines: int = 1):
+        super().__init__()
+        self.plan = plan
+        self.reasoning = "\n".join(f"{i}. Follow the scripted plan." for i in range(1, reasoning_lines + 1))
+        self.iterations = iterations
+        self.latency = latency
+        self.calls = 0
+        self._evaluations = {}
+        self._lock = threading.Lock()
+
+    def respond(self, system: str, prompt: str) -> str:
+        with self._lock:
+            self.calls += 1
+            if PLAN_PROMPT in system:
+                return f"Reasoning:\n{self.reasoning}\n\nPlan:\n{self.plan}"
+            if GOAL_EVALUATION_PROMPT in system:
+                match = GOAL_PATTERN.search(prompt)
+                goal = match.group(1) if match else ""
+                self._evaluations[goal] = self._evaluations.get(goal, 0) + 1
+                achieved = "Yes" if self._evaluations[goal] >= self.iterations else "No"
+                return f"Analysis:\n1. Scripted evaluation.\n\nGoal achieved: {achieved}"
+            if STEP_REVIEW_PROMPT in system:
+                return "No modification needed."
+            if ERROR_PROMPT in system:
+                return "Retry the step."
+            if SUMMARY_PROMPT in system:
+                return "The agent followed the scripted plan."
+            return "OK"
+
+class _FixtureHandler(_QuietHandler):
+    def do_GET(self):
+        owner = self.server.owner
+        time.sleep(owner.latency)
+        if self.path.startswith("/articles/"):
+            number = self.path.rsplit("/", 1)[-1]
+            # Markup, scripts and navigation around the text, as on a real article page
+            head = (f"<html><head><title>Article {number}</title><style>{'p { margin: 0 } ' * 50}</style>"
+                    f"<script>{'var tracking = {}; ' * 100}</script></head><body>"
+                    f"<nav>{''.join(f'<a href=/articles/{i}>Article {i}</a>' for i in range(1, 21))}</nav>"
+                    f"<h1>Article {number}</h1>")
+            paragraph = f"<p>Article {number}: offline fixture text for benchmarking the agent. </p>"
+            body = f"{head}{paragraph * (owner.page_size // len(paragraph) + 1)}</body></html>"
+            self._send(200, body[:owner.page_size].encode("utf-8"), "text/html; charset=utf-8", {"Cache-Control": "no-store"})
+        elif self.path.startswith("/data.json"):
+            body = json.dumps({"items": [{"id": i, "title": f"Item {i}"} for i in range(50)]})
+            self._send(200, body.encode("utf-8"), "application/json", {"Cache-Control": "no-store"})
+        else:
+            self._send(404, b"not found", "text/plain")
+
+class FixtureHTTPServer(_Server):
+    handler = _FixtureHandler
+
+    def __init__(self, page_size: int = 20000, latency: float = 0.0):
+        super().__init__()
+        self.page_size = page_size
+        self.latency = latency
@@ -5,10 +5,14 @@ setup(
     version="0.1",
     packages=find_packages(),
     install_requires=[
-        "openai",
+        # The chat client and scheduler use the 0.x API (openai.ChatCompletion, openai.error)
+        "openai>=0.27,<1",
         "requests",
         "beautifulsoup4",
         "python-dotenv",
         # Add any other dependencies here
     ],
+    extras_require={
+        "speedups": ["selectolax", "lxml", "ijson"],
+    },
 )
\ No newline at end of file